@@ -1,6 +1,6 @@
 {
     'name': 'Hamarpea Surgery Coordination',
-    'version': '18.0.1.0.0',
+    'version': '18.0.1.1.0',
     'category': 'Healthcare',
     'summary': 'Manage surgical cases from consultation to completion',
     'description': """
@@ -28,17 +28,38 @@ Track patient journey through surgery with:
         'partner_contact_personal_information_page',  # For birthdate
     ],
     'data': [
+        'security/surgery_security.xml',
         'security/ir.model.access.csv',
         'data/surgery_stage_data.xml',
+        'data/surgery_stage_rule_data.xml',
+        'data/ir_config_parameter_data.xml',
+        'data/ir_cron_data.xml',
+        'data/surgery_claim_layout_data.xml',
         'wizard/generate_reconciliation_so_views.xml',
+        'wizard/surgery_case_export_views.xml',
+        'wizard/generate_surgicenter_statement_views.xml',
+        'wizard/surgery_or_forecast_views.xml',
+        'wizard/surgery_fulltext_search_views.xml',
         'views/surgery_stage_views.xml',
+        'views/surgery_stage_rule_views.xml',
         'views/surgery_medical_item_views.xml',
+        'views/surgery_lab_document_views.xml',
         'views/surgery_payment_line_views.xml',
         'views/surgery_drug_restriction_views.xml',
         'views/res_partner_views.xml',
         'views/hr_employee_views.xml',
         'views/surgery_case_views.xml',
+        'views/surgery_case_stage_history_views.xml',
         'views/sale_order_views.xml',
+        'views/crm_lead_views.xml',
+        'views/surgery_surgicenter_statement_views.xml',
+        'views/surgery_perf_log_views.xml',
+        'views/surgery_claim_batch_views.xml',
+        'views/surgery_event_outbox_views.xml',
+        'views/surgery_cash_projection_views.xml',
+        'views/surgery_audit_exception_views.xml',
+        'views/surgery_recompute_job_views.xml',
+        'report/surgicenter_statement_report.xml',
         'views/menu_views.xml',
     ],
     'demo': [
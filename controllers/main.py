@@ -0,0 +1,129 @@
+import hashlib
+
+from odoo import api, http
+from odoo.http import request, content_disposition, Response
+from odoo.modules.registry import Registry
+
+EVENT_PAGE_LIMIT = 1000
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv;charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+class SurgeryCoordinationController(http.Controller):
+
+    @http.route('/surgery/export/accounting/<int:wizard_id>', type='http', auth='user')
+    def export_accounting(self, wizard_id, **kwargs):
+        """Stream the accounting export of surgery cases and payment lines.
+
+        The body is generated lazily on a dedicated cursor, since the request
+        cursor is closed before werkzeug consumes the response iterator.
+        """
+        wizard = request.env['surgery.case.export'].browse(wizard_id).exists()
+        if not wizard:
+            return request.not_found()
+        filename = wizard._get_export_filename()
+        mimetype = EXPORT_MIMETYPES[wizard.file_format]
+
+        dbname = request.env.cr.dbname
+        uid = request.env.uid
+        context = dict(request.env.context)
+
+        def generate():
+            with Registry(dbname).cursor() as cr:
+                env = api.Environment(cr, uid, context)
+                yield from env['surgery.case.export'].browse(wizard_id)._iter_export_file()
+
+        return Response(
+            generate(),
+            headers=[
+                ('Content-Type', mimetype),
+                ('Content-Disposition', content_disposition(filename)),
+                ('X-Content-Type-Options', 'nosniff'),
+            ],
+            direct_passthrough=True,
+        )
+
+    @http.route([
+        '/surgery/center/cases',
+        '/surgery/center/<int:center_id>/cases',
+    ], type='http', auth='user', methods=['GET'])
+    def center_cases(self, center_id=None, page=0, **kwargs):
+        """Read-only JSON listing of a surgical center's cases and payment lines.
+
+        Portal users of a center only see their own center; internal users
+        may query any center. Responses carry ETag/Last-Modified so polling
+        clients get a 304 until something changes.
+        """
+        user = request.env.user
+        if not user._is_internal():
+            center_id = user.commercial_partner_id.id
+        center = request.env['res.partner'].sudo().browse(int(center_id or 0)).exists()
+        if not center or center.account_type != 'operating_room':
+            return request.not_found()
+        try:
+            page = max(int(page), 0)
+        except ValueError:
+            page = 0
+
+        SurgeryCase = request.env['surgery.case']
+        stamp = SurgeryCase._get_center_portal_stamp(center.id)
+        etag = hashlib.sha1(f"{center.id}-{page}-{request.env.lang}-{'-'.join(map(str, stamp))}".encode()).hexdigest()
+
+        response = Response(
+            SurgeryCase._get_center_portal_payload(center.id, page, stamp),
+            headers=[
+                ('Content-Type', 'application/json'),
+                ('Cache-Control', 'private, no-cache'),
+            ],
+        )
+        response.set_etag(etag)
+        if stamp[0]:
+            response.last_modified = stamp[0]
+        return response.make_conditional(request.httprequest)
+
+    @http.route('/surgery/events', type='http', auth='user', methods=['GET'])
+    def events(self, after=0, limit=EVENT_PAGE_LIMIT, **kwargs):
+        """Outbox events past an offset, oldest first.
+
+        Consumers keep the returned `next_after` and pass it as `after` on
+        their next call, so each poll only reads new events.
+        """
+        try:
+            after = max(int(after), 0)
+            limit = min(max(int(limit), 1), EVENT_PAGE_LIMIT)
+        except ValueError:
+            return request.make_json_response({'error': 'after and limit must be integers'}, status=400)
+        Outbox = request.env['surgery.event.outbox']
+        Outbox.check_access('read')
+        events = Outbox.sudo()._read_after(after, limit)
+        return request.make_json_response({
+            'events': events,
+            'next_after': events[-1]['id'] if events else after,
+        })
+
+    @http.route('/surgery/medical_item/<int:item_id>/lab_documents', type='http', auth='user', methods=['POST'])
+    def upload_lab_documents(self, item_id, **kwargs):
+        """Attach uploaded lab files to a checklist item, storing each content once.
+
+        Files are read from werkzeug's spooled upload streams, so large scans
+        never go through base64 or a whole-file copy in memory.
+        """
+        item = request.env['surgery.medical.item'].browse(item_id).exists()
+        if not item:
+            return request.not_found()
+        item.check_access('write')
+        LabDocument = request.env['surgery.lab.document']
+        results = []
+        for upload in request.httprequest.files.getlist('ufile'):
+            document, created = LabDocument._get_or_create_from_stream(
+                upload.stream, upload.filename or 'lab-document', upload.mimetype,
+            )
+            document._link_to_item(item, upload.filename)
+            results.append({
+                'document_id': document.id,
+                'filename': upload.filename,
+                'duplicate': not created,
+            })
+        return request.make_json_response({'documents': results})
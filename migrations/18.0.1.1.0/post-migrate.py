@@ -0,0 +1,58 @@
+import logging
+
+from odoo import api, SUPERUSER_ID
+from odoo.tools.sql import table_exists
+
+from odoo.addons.hamarpea_odoo_surgery_coordination.models.surgery_case import DEFERRAL_DAYS_PARAM
+
+_logger = logging.getLogger(__name__)
+
+MERGED_CASES_TABLE = 'surgery_payment_line_merged_case'
+
+
+def migrate(cr, version):
+    env = api.Environment(cr, SUPERUSER_ID, {})
+
+    # Seed the stage ledger from existing stage_id tracking values
+    env['surgery.case.stage.history']._backfill_from_tracking()
+
+    # Stage automation delays count from when the case entered its stage
+    cr.execute("""
+        UPDATE surgery_case c
+           SET date_stage_entered = h.date_in
+          FROM surgery_case_stage_history h
+         WHERE h.surgery_case_id = c.id
+           AND h.date_out IS NULL
+           AND h.stage_id = c.stage_id
+    """)
+
+    # Cases already deferred come back after the default deferral period
+    cr.execute("""
+        UPDATE surgery_case c
+           SET deferred_until = COALESCE(c.date_stage_entered, c.write_date)::date + %s
+         WHERE c.stage_id = %s
+           AND c.deferred_until IS NULL
+    """, [
+        int(env['ir.config_parameter'].get_param(DEFERRAL_DAYS_PARAM, 90)),
+        env.ref('hamarpea_odoo_surgery_coordination.stage_deferred').id,
+    ])
+
+    # Cases confirmed on a sales order or from PreOp on keep their current fees
+    cr.execute("""
+        UPDATE surgery_case c
+           SET fee_locked = TRUE
+         WHERE c.stage_id = ANY(%s)
+            OR c.sale_order_id IN (SELECT id FROM sale_order WHERE state = 'sale')
+    """, [env['surgery.case']._get_fee_lock_stages().ids])
+
+    # Totals of cases whose duplicate payment lines were merged in pre-migrate
+    if table_exists(cr, MERGED_CASES_TABLE):
+        cr.execute(f"SELECT case_id FROM {MERGED_CASES_TABLE} ORDER BY case_id")
+        case_ids = [row[0] for row in cr.fetchall()]
+        cases = env['surgery.case'].browse(case_ids).exists()
+        if cases:
+            cases.payment_line_ids.write({'projection_stale': True})
+            cases.modified(['payment_line_ids'])
+            env.flush_all()
+            _logger.info("Recomputed totals of surgery cases %s after merging payment lines", cases.ids)
+        cr.execute(f"DROP TABLE {MERGED_CASES_TABLE}")
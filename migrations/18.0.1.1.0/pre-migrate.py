@@ -0,0 +1,336 @@
+import logging
+import time
+
+from odoo.tools.sql import column_exists, create_column, table_exists
+
+from odoo.addons.hamarpea_odoo_surgery_coordination.models.surgery_case import NEXT_ACTION_RULES
+
+_logger = logging.getLogger(__name__)
+
+# Stored computed and related fields, in dependency order: (table, column,
+# column type, fill query). A column that already exists is left alone; a
+# missing one is created and filled here with one statement, so the ORM finds
+# it at upgrade and does not compute it record by record. Each query mirrors
+# the field's compute method.
+STORED_COLUMNS = [
+    # ---- Payment lines ----
+    ('surgery_payment_line', 'balance', 'numeric', """
+        UPDATE surgery_payment_line
+           SET balance = COALESCE(expected_amount, 0) - COALESCE(received_amount, 0)
+    """),
+    ('surgery_payment_line', 'currency_id', 'int4', """
+        UPDATE surgery_payment_line l
+           SET currency_id = c.currency_id
+          FROM surgery_case c
+         WHERE c.id = l.surgery_case_id
+    """),
+    ('surgery_payment_line', 'patient_id', 'int4', """
+        UPDATE surgery_payment_line l
+           SET patient_id = c.partner_id
+          FROM surgery_case c
+         WHERE c.id = l.surgery_case_id
+    """),
+    ('surgery_payment_line', 'sale_order_id', 'int4', """
+        UPDATE surgery_payment_line l
+           SET sale_order_id = c.sale_order_id
+          FROM surgery_case c
+         WHERE c.id = l.surgery_case_id
+    """),
+    ('surgery_payment_line', 'reconciliation_invoice_id', 'int4', """
+        UPDATE surgery_payment_line l
+           SET reconciliation_invoice_id = aml.move_id
+          FROM account_move_line aml
+         WHERE aml.id = l.reconciliation_invoice_line_id
+    """),
+
+    # ---- Cases: patient and surgeon ----
+    ('surgery_case', 'patient_id_number', 'varchar', """
+        UPDATE surgery_case c
+           SET patient_id_number = p.vat
+          FROM res_partner p
+         WHERE p.id = c.partner_id
+    """),
+    ('surgery_case', 'patient_phone', 'varchar', """
+        UPDATE surgery_case c
+           SET patient_phone = p.phone
+          FROM res_partner p
+         WHERE p.id = c.partner_id
+    """),
+    ('surgery_case', 'patient_age', 'int4', """
+        UPDATE surgery_case c
+           SET patient_age = COALESCE(
+                   (SELECT (CURRENT_DATE - p.birthdate_date) / 365 FROM res_partner p WHERE p.id = c.partner_id),
+               0)
+    """),
+    ('surgery_case', 'surgeon_user_id', 'int4', """
+        UPDATE surgery_case c
+           SET surgeon_user_id = e.user_id
+          FROM hr_employee e
+         WHERE e.id = c.surgeon_employee_id
+    """),
+    ('surgery_case', 'is_contracted_insurance', 'bool', """
+        UPDATE surgery_case c
+           SET is_contracted_insurance = c.surgeon_employee_id IS NOT NULL
+               AND c.insurance_company_id IS NOT NULL
+               AND (EXISTS (SELECT 1 FROM employee_kupot_holim_rel r
+                             WHERE r.employee_id = c.surgeon_employee_id
+                               AND r.kupat_holim_id = c.insurance_company_id)
+                    OR EXISTS (SELECT 1 FROM employee_private_insurance_rel r
+                                WHERE r.employee_id = c.surgeon_employee_id
+                                  AND r.insurance_id = c.insurance_company_id))
+    """),
+
+    # ---- Cases: money ----
+    ('surgery_case', 'payment_total_expected', 'numeric', """
+        UPDATE surgery_case c
+           SET payment_total_expected = COALESCE(
+                   (SELECT SUM(l.expected_amount) FROM surgery_payment_line l WHERE l.surgery_case_id = c.id),
+               0)
+    """),
+    ('surgery_case', 'payment_total_received', 'numeric', """
+        UPDATE surgery_case c
+           SET payment_total_received = COALESCE(
+                   (SELECT SUM(l.received_amount) FROM surgery_payment_line l WHERE l.surgery_case_id = c.id),
+               0)
+    """),
+    ('surgery_case', 'sale_order_total', 'numeric', """
+        UPDATE surgery_case c
+           SET sale_order_total = COALESCE(
+                   (SELECT SUM(l.price_total)
+                      FROM sale_order_line l
+                     WHERE l.order_id = c.sale_order_id
+                       AND NOT COALESCE(l.is_informational, FALSE)
+                       AND COALESCE(l.display_type, '') NOT IN ('line_section', 'line_note')),
+               0)
+    """),
+    ('surgery_case', 'deposit_paid', 'bool', """
+        UPDATE surgery_case c
+           SET deposit_paid = c.sale_order_id IS NOT NULL AND EXISTS (
+                   SELECT 1
+                     FROM sale_order_line sol
+                     JOIN sale_order_line_invoice_rel r ON r.order_line_id = sol.id
+                     JOIN account_move_line aml ON aml.id = r.invoice_line_id
+                     JOIN account_move m ON m.id = aml.move_id
+                    WHERE sol.order_id = c.sale_order_id
+                      AND m.move_type IN ('out_invoice', 'out_refund')
+                      AND m.payment_state IN ('in_payment', 'paid', 'partial'))
+    """),
+    ('surgery_case', 'payment_plan_valid', 'bool', """
+        UPDATE surgery_case c
+           SET payment_plan_valid = c.sale_order_id IS NULL OR (
+                   EXISTS (SELECT 1 FROM surgery_payment_line l WHERE l.surgery_case_id = c.id)
+                   AND ABS(COALESCE(c.payment_total_expected, 0) - COALESCE(c.sale_order_total, 0)) <= 0.01)
+    """),
+    ('surgery_case', 'so_status', 'varchar', """
+        UPDATE surgery_case c
+           SET so_status = CASE
+                   WHEN c.sale_order_id IS NULL THEN 'no_so'
+                   WHEN so.state IN ('draft', 'sent') THEN 'draft'
+                   WHEN COALESCE(c.sale_order_total, 0) != 0
+                        AND ABS(COALESCE(c.payment_total_received, 0) - c.sale_order_total) < 0.01
+                        THEN 'payment_complete'
+                   ELSE 'confirmed'
+               END
+          FROM surgery_case c2
+     LEFT JOIN sale_order so ON so.id = c2.sale_order_id
+         WHERE c2.id = c.id
+    """),
+    ('surgery_case', 'financial_status', 'varchar', """
+        UPDATE surgery_case c
+           SET financial_status = CASE
+                   WHEN so.id IS NULL OR so.state NOT IN ('sale', 'done') THEN 'incomplete'
+                   WHEN NOT c.payment_plan_valid THEN 'incomplete'
+                   WHEN NOT c.deposit_paid THEN 'pending'
+                   ELSE 'approved'
+               END
+          FROM surgery_case c2
+     LEFT JOIN sale_order so ON so.id = c2.sale_order_id
+         WHERE c2.id = c.id
+    """),
+    ('surgery_case', 'ready_for_scheduling', 'bool', """
+        UPDATE surgery_case SET ready_for_scheduling = COALESCE(financial_status = 'approved', FALSE)
+    """),
+
+    # ---- Cases: surgeon fees (no case is locked before this version) ----
+    ('surgery_case', 'surgeon_fee', 'numeric', """
+        UPDATE surgery_case c
+           SET surgeon_fee = COALESCE(pt.list_price, 0)
+          FROM surgery_case c2
+     LEFT JOIN product_product pp ON pp.id = c2.surgery_product_id
+     LEFT JOIN product_template pt ON pt.id = pp.product_tmpl_id
+         WHERE c2.id = c.id
+    """),
+    ('surgery_case', 'processing_fee_pct', 'numeric', """
+        UPDATE surgery_case c
+           SET processing_fee_pct = CASE
+                   WHEN c.surgery_location = 'external' AND c.surgicenter_id IS NOT NULL
+                        THEN COALESCE((SELECT p.processing_fee_pct FROM res_partner p WHERE p.id = c.surgicenter_id), 0)
+                   ELSE 0
+               END
+    """),
+    ('surgery_case', 'processing_fee_amount', 'numeric', """
+        UPDATE surgery_case
+           SET processing_fee_amount = CASE
+                   WHEN surgery_location = 'external' AND surgicenter_id IS NOT NULL AND surgery_product_id IS NOT NULL
+                        THEN ROUND(COALESCE(surgeon_fee, 0) * COALESCE(processing_fee_pct, 0) / 100, 2)
+                   ELSE 0
+               END
+    """),
+    ('surgery_case', 'expected_surgeon_payment', 'numeric', """
+        UPDATE surgery_case
+           SET expected_surgeon_payment = CASE
+                   WHEN surgery_product_id IS NULL THEN 0
+                   WHEN surgery_location = 'external' AND surgicenter_id IS NOT NULL
+                        THEN COALESCE(surgeon_fee, 0)
+                             - ROUND(COALESCE(surgeon_fee, 0) * COALESCE(processing_fee_pct, 0) / 100, 2)
+                   ELSE COALESCE(surgeon_fee, 0)
+               END
+    """),
+
+    # ---- Medical checklist ----
+    ('surgery_medical_item', 'is_required', 'bool', """
+        UPDATE surgery_medical_item m
+           SET is_required = CASE m.test_type
+                   WHEN 'ecg' THEN COALESCE(c.patient_age, 0) >= 40
+                   WHEN 'chest_xray' THEN COALESCE(c.patient_age, 0) >= 60
+                   ELSE TRUE
+               END
+          FROM surgery_case c
+         WHERE c.id = m.surgery_case_id
+    """),
+    ('surgery_case', 'medical_status', 'varchar', """
+        UPDATE surgery_case c
+           SET medical_status = CASE
+                   WHEN NOT EXISTS (SELECT 1 FROM surgery_medical_item m WHERE m.surgery_case_id = c.id)
+                        THEN 'pending'
+                   WHEN c.medical_confirmed THEN 'confirmed'
+                   WHEN EXISTS (SELECT 1 FROM surgery_medical_item m
+                                 WHERE m.surgery_case_id = c.id AND m.status = 'received_abnormal')
+                        THEN 'review_needed'
+                   WHEN NOT EXISTS (SELECT 1 FROM surgery_medical_item m
+                                     WHERE m.surgery_case_id = c.id AND m.is_required
+                                       AND m.status NOT IN ('received_normal', 'not_applicable'))
+                        THEN 'review_needed'
+                   ELSE 'in_progress'
+               END
+    """),
+    ('surgery_case', 'ready_for_surgery', 'bool', """
+        UPDATE surgery_case
+           SET ready_for_surgery = COALESCE(medical_confirmed AND financial_status = 'approved', FALSE)
+    """),
+
+    # ---- Cases: next action ----
+    ('surgery_case', 'next_action', 'varchar', """
+        UPDATE surgery_case c
+           SET next_action = CASE
+                   WHEN s.fold THEN 'none'
+                   WHEN c.so_status = 'no_so' THEN 'create_so'
+                   WHEN c.so_status = 'draft' THEN 'confirm_so'
+                   WHEN NOT c.payment_plan_valid THEN 'fix_payment_plan'
+                   WHEN c.insurance_company_id IS NOT NULL AND c.insurance_claim_status = 'not_submitted'
+                        THEN 'submit_claim'
+                   WHEN c.medical_status IN ('pending', 'in_progress') THEN 'collect_medical'
+                   WHEN c.medical_status = 'review_needed' THEN 'review_medical'
+                   WHEN c.financial_status IS DISTINCT FROM 'approved' THEN 'collect_payment'
+                   WHEN c.ready_for_surgery AND c.surgery_date IS NULL THEN 'schedule_surgery'
+                   ELSE 'none'
+               END
+          FROM surgery_stage s
+         WHERE s.id = c.stage_id
+    """),
+    ('surgery_case', 'next_action_priority', 'int4', """
+        UPDATE surgery_case c
+           SET next_action_priority = COALESCE(r.priority, 0)
+          FROM surgery_case c2
+     LEFT JOIN unnest(%(actions)s::varchar[], %(priorities)s::int[]) AS r(action, priority)
+            ON r.action = c2.next_action
+         WHERE c2.id = c.id
+    """),
+    ('surgery_case', 'next_action_due', 'date', """
+        UPDATE surgery_case c
+           SET next_action_due = c.surgery_date - r.lead_days
+          FROM unnest(%(actions)s::varchar[], %(lead_days)s::int[]) AS r(action, lead_days)
+         WHERE r.action = c.next_action
+           AND r.lead_days IS NOT NULL
+    """),
+]
+
+# Keep one client and one surgicenter line per case, so the unique index on
+# (case, source) can be created: the oldest line takes over the amounts and
+# references of the lines it replaces. The affected cases are listed in
+# MERGED_CASES_TABLE for post-migrate to recompute their totals.
+MERGED_CASES_TABLE = 'surgery_payment_line_merged_case'
+MERGE_SINGLETON_LINES = f"""
+    WITH ranked AS (
+        SELECT id,
+               MIN(id) OVER (PARTITION BY surgery_case_id, payment_source) AS keep_id
+          FROM surgery_payment_line
+         WHERE payment_source IN ('client', 'surgicenter')
+    ),
+    duplicates AS (
+        SELECT id, keep_id FROM ranked WHERE id != keep_id
+    ),
+    totals AS (
+        SELECT d.keep_id,
+               SUM(COALESCE(o.expected_amount, 0)) AS expected_amount,
+               SUM(COALESCE(o.received_amount, 0)) AS received_amount,
+               STRING_AGG(NULLIF(o.reference, ''), ', ' ORDER BY o.id) AS refs
+          FROM duplicates d
+          JOIN surgery_payment_line o ON o.id = d.id
+      GROUP BY d.keep_id
+    ),
+    merged AS (
+        UPDATE surgery_payment_line l
+           SET expected_amount = COALESCE(l.expected_amount, 0) + t.expected_amount,
+               received_amount = COALESCE(l.received_amount, 0) + t.received_amount,
+               reference = NULLIF(CONCAT_WS(', ', NULLIF(l.reference, ''), t.refs), '')
+          FROM totals t
+         WHERE l.id = t.keep_id
+     RETURNING l.surgery_case_id
+    ),
+    deleted AS (
+        DELETE FROM surgery_payment_line l
+         USING duplicates d
+         WHERE l.id = d.id
+    )
+    INSERT INTO {MERGED_CASES_TABLE} (case_id)
+    SELECT DISTINCT surgery_case_id FROM merged
+    ON CONFLICT DO NOTHING
+"""
+
+def migrate(cr, version):
+    if not table_exists(cr, 'surgery_case'):
+        return
+    if not column_exists(cr, 'sale_order_line', 'is_informational'):
+        create_column(cr, 'sale_order_line', 'is_informational', 'bool')
+
+    missing = [
+        (table, column, column_type, query)
+        for table, column, column_type, query in STORED_COLUMNS
+        if table_exists(cr, table) and not column_exists(cr, table, column)
+    ]
+    # Create every column first: fill queries may read columns added after them
+    for table, column, column_type, _query in missing:
+        create_column(cr, table, column, column_type)
+
+    params = {
+        'actions': list(NEXT_ACTION_RULES),
+        'priorities': [priority for priority, _lead_days in NEXT_ACTION_RULES.values()],
+        'lead_days': [lead_days for _priority, lead_days in NEXT_ACTION_RULES.values()],
+    }
+    for table, column, _column_type, query in missing:
+        start = time.monotonic()
+        cr.execute(query, params)
+        _logger.info("Filled %s.%s on %s rows in %.1fs", table, column, cr.rowcount, time.monotonic() - start)
+
+    if table_exists(cr, 'surgery_payment_line'):
+        cr.execute(f"CREATE TABLE IF NOT EXISTS {MERGED_CASES_TABLE} (case_id int4 PRIMARY KEY)")
+        cr.execute(MERGE_SINGLETON_LINES)
+        if cr.rowcount:
+            _logger.info("Merged duplicate client/surgicenter payment lines of %s case(s)", cr.rowcount)
+            cr.execute(f"""
+                UPDATE surgery_payment_line
+                   SET balance = COALESCE(expected_amount, 0) - COALESCE(received_amount, 0)
+                 WHERE payment_source IN ('client', 'surgicenter')
+                   AND surgery_case_id IN (SELECT case_id FROM {MERGED_CASES_TABLE})
+            """)
@@ -1,11 +1,23 @@
+from . import surgery_event_outbox
 from . import surgery_payment_line
 from . import surgery_case
 from . import surgery_stage
+from . import surgery_stage_rule
+from . import surgery_case_stage_history
 from . import surgery_medical_item
 from . import surgery_drug_restriction
 from . import res_partner
 from . import hr_employee
 from . import sale_order
 from . import sale_order_line
+from . import surgery_case_generation_job
+from . import surgery_surgicenter_statement
 from . import calendar_event
 from . import product_template
+from . import crm_lead
+from . import surgery_perf_log
+from . import surgery_claim_batch
+from . import surgery_cash_projection
+from . import surgery_audit_exception
+from . import surgery_recompute_job
+from . import surgery_lab_document
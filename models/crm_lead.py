@@ -0,0 +1,166 @@
+from odoo import models, fields
+from odoo.exceptions import UserError
+from odoo.tools import html2plaintext
+
+
+class CrmLead(models.Model):
+    _inherit = 'crm.lead'
+
+    surgery_product_id = fields.Many2one(
+        'product.product',
+        string='Surgery Procedure',
+        domain=[('service_tracking', '=', 'surgery_case')],
+        help='Procedure discussed at the consultation; required to convert the lead into a surgery case'
+    )
+
+    surgery_surgeon_id = fields.Many2one(
+        'hr.employee',
+        string='Requested Surgeon',
+        help='Leave empty to pick an authorized surgeon at conversion'
+    )
+
+    surgery_case_id = fields.Many2one(
+        'surgery.case',
+        string='Surgery Case',
+        index='btree_not_null',
+        copy=False,
+        ondelete='set null',
+        help='Case this opportunity was converted into'
+    )
+
+    def _resolve_surgery_patients(self):
+        """Give every lead a patient, matching existing contacts by email in one search
+        and creating the missing ones in one batch"""
+        leads = self.filtered(lambda l: not l.partner_id)
+        if not leads:
+            return
+        emails = {lead.email_normalized for lead in leads if lead.email_normalized}
+        partners_by_email = {}
+        if emails:
+            for partner in self.env['res.partner'].search(
+                [('email_normalized', 'in', list(emails)), ('is_company', '=', False)], order='id'
+            ):
+                partners_by_email.setdefault(partner.email_normalized, partner)
+
+        to_create = {}
+        for lead in leads:
+            if lead.email_normalized in partners_by_email:
+                continue
+            name = lead.contact_name or lead.partner_name or lead.email_from
+            if not name:
+                raise UserError(f"Lead \"{lead.name}\" has no contact name or email to create the patient from.")
+            key = lead.email_normalized or f'lead-{lead.id}'
+            to_create.setdefault(key, lead._prepare_customer_values(name))
+        created = self.env['res.partner'].create(list(to_create.values()))
+        partners_by_key = dict(zip(to_create, created))
+        partners_by_key.update(partners_by_email)
+
+        # One write per patient rather than per lead
+        leads_by_partner = {}
+        for lead in leads:
+            partner = partners_by_key[lead.email_normalized or f'lead-{lead.id}']
+            leads_by_partner.setdefault(partner, self.browse())
+            leads_by_partner[partner] |= lead
+        for partner, partner_leads in leads_by_partner.items():
+            partner_leads.partner_id = partner
+
+    def action_convert_to_surgery_case(self):
+        """Convert opportunities into surgery cases in one batch.
+
+        Patients, surgeons and open duplicates are resolved with a handful of
+        queries for the whole selection, and cases are created with a single
+        create() that also builds their checklists and surgicenter lines.
+        A lead whose patient already has an open case for the procedure is
+        linked to that case instead.
+        """
+        leads = self.filtered(lambda l: not l.surgery_case_id)
+        missing = leads.filtered(lambda l: not l.surgery_product_id)
+        if missing:
+            raise UserError(
+                "Set the surgery procedure on these opportunities first:\n" +
+                "\n".join(f"- {lead.name}" for lead in missing)
+            )
+        if not leads:
+            raise UserError("The selected opportunities are already converted.")
+
+        leads._resolve_surgery_patients()
+        SurgeryCase = self.env['surgery.case']
+        existing = SurgeryCase._find_open_duplicates(
+            [(lead.partner_id.id, lead.surgery_product_id.id) for lead in leads]
+        )
+
+        leads_to_link = {}
+        leads_to_create = {}
+        for lead in leads:
+            key = (lead.partner_id.id, lead.surgery_product_id.id)
+            if key in existing:
+                leads_to_link.setdefault(existing[key], []).append(lead)
+            else:
+                leads_to_create.setdefault(key, []).append(lead)
+
+        groups = list(leads_to_create.values())
+        unassigned = [group[0] for group in groups if not group[0].surgery_surgeon_id]
+        resolved = dict(zip(unassigned, self.env['hr.employee']._resolve_surgeons(
+            [(lead.surgery_product_id, lead.partner_id) for lead in unassigned],
+            fallback=False,
+        )))
+        no_surgeon = [
+            lead
+            for group in groups if not (group[0].surgery_surgeon_id or resolved[group[0]])
+            for lead in group
+        ]
+        if no_surgeon:
+            raise UserError(
+                "No authorized surgeon found for these opportunities; set the surgeon first:\n" +
+                "\n".join(f"- {lead.name}" for lead in no_surgeon)
+            )
+
+        new_cases = SurgeryCase.with_context(surgery_allow_duplicate=True).create([
+            {
+                'partner_id': group[0].partner_id.id,
+                'surgery_product_id': group[0].surgery_product_id.id,
+                'surgeon_employee_id': (group[0].surgery_surgeon_id or resolved[group[0]]).id,
+                'surgery_plan': html2plaintext(group[0].description) if group[0].description else False,
+            }
+            for group in groups
+        ])
+
+        # Client payment line from the expected revenue of the opportunity
+        client_vals = {
+            surgery_case.id: {'expected_amount': group[0].expected_revenue}
+            for surgery_case, group in zip(new_cases, groups)
+            if group[0].expected_revenue
+        }
+        if client_vals:
+            self.env['surgery.payment.line']._upsert_singleton_lines('client', client_vals)
+
+        for surgery_case, group in zip(new_cases, groups):
+            self.browse([lead.id for lead in group]).surgery_case_id = surgery_case
+        for case_id, group in leads_to_link.items():
+            surgery_case = SurgeryCase.browse(case_id)
+            self.browse([lead.id for lead in group]).surgery_case_id = surgery_case
+            surgery_case.message_post(
+                body="Opportunity linked to this existing open case instead of creating a duplicate: " +
+                     ", ".join(lead.name for lead in group)
+            )
+
+        cases = new_cases | SurgeryCase.browse(list(leads_to_link))
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Surgery Cases',
+            'res_model': 'surgery.case',
+            'view_mode': 'list,form',
+            'domain': [('id', 'in', cases.ids)],
+            'target': 'current',
+        }
+
+    def action_view_surgery_case(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Surgery Case',
+            'res_model': 'surgery.case',
+            'res_id': self.surgery_case_id.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
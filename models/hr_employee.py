@@ -1,4 +1,4 @@
-from odoo import models, fields
+from odoo import models, fields, api
 
 
 class HrEmployee(models.Model):
@@ -36,3 +36,82 @@ class HrEmployee(models.Model):
         domain=[('sale_ok', '=', True)],
         help='Surgical procedures this surgeon is authorized to perform'
     )
+
+    daily_surgery_capacity = fields.Integer(
+        string='Surgeries per Day',
+        help='Surgeries this surgeon can perform per day, used by the OR forecast'
+    )
+
+    @api.model
+    def _resolve_surgeons(self, requests, fallback=True):
+        """Pick a surgeon for each (product, patient) pair of a batch.
+
+        Surgeons authorized for the procedure are preferred, then those with
+        privileges at one of the patient's insurers, then the least loaded
+        by upcoming cases. Authorizations, privileges and loads are loaded
+        once for the whole batch. Falls back to the current user's employee,
+        or the first employee, when nobody is authorized.
+
+        :param requests: list of (product.product, res.partner) pairs
+        :param fallback: when False, pairs nobody is authorized for get an
+            empty recordset instead
+        :return: list of hr.employee records, in the order of requests
+        """
+        if not requests:
+            return []
+
+        product_ids = tuple({product.id for product, _partner in requests if product})
+        authorized = {}
+        if product_ids:
+            self.env.cr.execute("""
+                SELECT rel.product_id, rel.employee_id
+                  FROM employee_authorized_procedure_rel rel
+                  JOIN hr_employee e ON e.id = rel.employee_id
+                 WHERE e.active AND rel.product_id IN %s
+            """, [product_ids])
+            for product_id, employee_id in self.env.cr.fetchall():
+                authorized.setdefault(product_id, []).append(employee_id)
+
+        candidates = self.browse({eid for eids in authorized.values() for eid in eids})
+        candidates.fetch(['kupot_holim_ids', 'private_insurance_ids'])
+        insurers = {
+            employee.id: set(employee.kupot_holim_ids.ids) | set(employee.private_insurance_ids.ids)
+            for employee in candidates
+        }
+
+        # Upcoming load: open cases not yet operated on
+        loads = dict.fromkeys(candidates.ids, 0)
+        if candidates:
+            today = fields.Date.context_today(self)
+            groups = self.env['surgery.case'].sudo()._read_group(
+                [('surgeon_employee_id', 'in', candidates.ids),
+                 ('stage_id.fold', '=', False),
+                 '|', ('surgery_date', '=', False), ('surgery_date', '>=', today)],
+                ['surgeon_employee_id'],
+                ['__count'],
+            )
+            for surgeon, count in groups:
+                loads[surgeon.id] = count
+
+        default_surgeon = None
+        surgeons = []
+        for product, partner in requests:
+            employee_ids = authorized.get(product.id)
+            if not employee_ids:
+                if not fallback:
+                    surgeons.append(self.browse())
+                    continue
+                if default_surgeon is None:
+                    default_surgeon = self.search([('user_id', '=', self.env.user.id)], limit=1) \
+                        or self.search([], limit=1)
+                surgeons.append(default_surgeon)
+                continue
+            patient_insurers = set(partner.kupat_holim_id.ids) | set(partner.private_insurance_ids.ids)
+            employee_id = min(employee_ids, key=lambda eid: (
+                not (insurers[eid] & patient_insurers),
+                loads[eid],
+                eid,
+            ))
+            loads[employee_id] += 1
+            surgeons.append(self.browse(employee_id))
+        return surgeons
@@ -1,4 +1,5 @@
 from odoo import models, fields
+from odoo.tools.sql import create_index, FunctionStatus
 
 
 class ResPartner(models.Model):
@@ -10,3 +11,35 @@ class ResPartner(models.Model):
         help='Percentage deducted from surgeon fees (e.g., 4.0 for 4%)',
         digits=(5, 2)
     )
+
+    or_daily_capacity = fields.Integer(
+        string='OR Capacity (Cases/Day)',
+        help='Surgeries the center can host per day, used by the OR forecast'
+    )
+
+    # Insurer fields
+    claim_layout_id = fields.Many2one(
+        'surgery.claim.layout',
+        string='Claim File Layout',
+        help='Layout of batch claim submission files; the default layout is used when empty'
+    )
+
+    def init(self):
+        """Trigram index on partner name for patient lookups from surgery cases.
+
+        The standard btree index on name cannot serve ilike searches; this
+        one mirrors what the ORM builds for index='trigram' fields.
+        """
+        super().init()
+        if not self.pool.has_trigram:
+            return
+        expression = '"name"'
+        if self.pool.has_unaccent == FunctionStatus.INDEXABLE:
+            expression = f'unaccent({expression})'
+        create_index(
+            self.env.cr,
+            'res_partner_name_surgery_trgm_index',
+            self._table,
+            [f'{expression} gin_trgm_ops'],
+            method='gin',
+        )
@@ -1,4 +1,6 @@
-from odoo import models, fields
+from odoo import models, fields, api
+
+from .surgery_perf_log import surgery_timed
 
 
 class SaleOrder(models.Model):
@@ -9,22 +11,64 @@ class SaleOrder(models.Model):
         string='Surgery Cases'
     )
 
+    surgery_generation_job_ids = fields.One2many(
+        'surgery.case.generation.job',
+        'order_id',
+        string='Surgery Case Generation Jobs'
+    )
+
+    surgery_generation_state = fields.Selection([
+        ('none', 'None'),
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed')
+    ], compute='_compute_surgery_generation_state', string='Surgery Case Generation')
+
     def _compute_surgery_case_count(self):
         for order in self:
             order.surgery_case_count = self.env['surgery.case'].search_count([
                 ('sale_order_id', '=', order.id)
             ])
 
+    @api.depends('surgery_generation_job_ids.state')
+    def _compute_surgery_generation_state(self):
+        for order in self:
+            states = set(order.surgery_generation_job_ids.mapped('state'))
+            if 'failed' in states:
+                order.surgery_generation_state = 'failed'
+            elif 'pending' in states:
+                order.surgery_generation_state = 'pending'
+            elif states:
+                order.surgery_generation_state = 'done'
+            else:
+                order.surgery_generation_state = 'none'
+
+    @surgery_timed('sale.order._action_confirm')
     def _action_confirm(self):
         """On SO confirmation, create surgery cases for products with surgery_case tracking"""
         result = super()._action_confirm()
 
-        # Generate surgery cases for relevant lines
-        for order in self:
-            order.order_line.sudo()._surgery_case_generation()
+        # Freeze fees of cases already linked to these orders
+        self.env['surgery.case'].sudo().search([
+            ('sale_order_id', 'in', self.ids),
+            ('fee_locked', '=', False),
+        ]).write({'fee_locked': True})
+
+        Job = self.env['surgery.case.generation.job'].sudo()
+        if Job._is_async_enabled():
+            # Queue generation so confirmation does not wait for it
+            Job._enqueue(self.order_line.sudo())
+        else:
+            # Generate surgery cases for relevant lines of all orders at once
+            self.order_line.sudo()._surgery_case_generation()
 
         return result
 
+    def action_retry_surgery_case_generation(self):
+        """Requeue failed surgery case generation jobs"""
+        self.env['surgery.case.generation.job'].sudo()._enqueue(self.order_line.sudo())
+        return True
+
     def action_view_surgery_cases(self):
         """Smart button action to view linked surgery cases"""
         self.ensure_one()
@@ -39,36 +39,77 @@ class SaleOrderLine(models.Model):
         return super()._prepare_invoice_line(**optional_values)
 
     def _surgery_case_generation(self):
-        """Create surgery cases for lines with surgery_case service tracking"""
+        """Create surgery cases for lines with surgery_case service tracking.
+
+        Lines whose patient already has an open case for the same procedure
+        are linked to that case instead of creating a duplicate, and a
+        warning is posted on the order.
+        """
         SurgeryCase = self.env['surgery.case']
+        lines = self.filtered(
+            lambda l: l.product_id.service_tracking == 'surgery_case' and not l.surgery_case_id
+        )
+        if not lines:
+            return
 
-        for line in self:
-            if line.product_id.service_tracking != 'surgery_case':
-                continue
-            if line.surgery_case_id:
-                # Already has a surgery case linked
-                continue
+        # One lookup for the whole batch of (patient, procedure) pairs
+        existing = SurgeryCase._find_open_duplicates(
+            [(line.order_id.partner_id.id, line.product_id.id) for line in lines]
+        )
 
-            # Get default surgeon from employee linked to current user or first available
-            default_surgeon = self.env['hr.employee'].search([
-                ('user_id', '=', self.env.user.id)
-            ], limit=1)
-            if not default_surgeon:
-                default_surgeon = self.env['hr.employee'].search([], limit=1)
+        lines_to_link = {}
+        lines_to_create = {}
+        for line in lines:
+            key = (line.order_id.partner_id.id, line.product_id.id)
+            if key in existing:
+                lines_to_link.setdefault(existing[key], []).append(line)
+            else:
+                lines_to_create.setdefault(key, []).append(line)
 
-            # Create the surgery case
-            surgery_case = SurgeryCase.create({
-                'partner_id': line.order_id.partner_id.id,
-                'surgery_product_id': line.product_id.id,
-                'sale_order_id': line.order_id.id,
-                'surgeon_employee_id': default_surgeon.id if default_surgeon else False,
-                'surgery_plan': line.name,
-            })
+        # Resolve authorized surgeons for the whole batch at once
+        groups = list(lines_to_create.values())
+        surgeons = self.env['hr.employee']._resolve_surgeons(
+            [(group[0].product_id, group[0].order_id.partner_id) for group in groups]
+        )
 
+        # Create the surgery cases, one per patient and procedure
+        new_cases = SurgeryCase.with_context(surgery_allow_duplicate=True).create([
+            {
+                'partner_id': group[0].order_id.partner_id.id,
+                'surgery_product_id': group[0].product_id.id,
+                'sale_order_id': group[0].order_id.id,
+                'surgeon_employee_id': surgeon.id,
+                'surgery_plan': group[0].name,
+            }
+            for group, surgeon in zip(groups, surgeons)
+        ])
+        # Lock only once the fee snapshot has been taken on create
+        new_cases.write({'fee_locked': True})
+        for surgery_case, group in zip(new_cases, groups):
             # Link the surgery case back to the line
-            line.surgery_case_id = surgery_case.id
+            group[0].surgery_case_id = surgery_case.id
 
             # Post a message on the surgery case
             surgery_case.message_post(
-                body=f"Surgery case created from Sales Order {line.order_id.name}"
+                body=f"Surgery case created from Sales Order {group[0].order_id.name}"
             )
+            if len(group) > 1:
+                lines_to_link.setdefault(surgery_case.id, []).extend(group[1:])
+
+        # Link remaining lines to the open case they would have duplicated
+        for case_id, group in lines_to_link.items():
+            surgery_case = SurgeryCase.browse(case_id)
+            for line in group:
+                line.surgery_case_id = surgery_case.id
+                order = line.order_id
+                if not surgery_case.sale_order_id or surgery_case.sale_order_id.state == 'cancel':
+                    surgery_case.sale_order_id = order.id
+                surgery_case.message_post(
+                    body=f"Sales Order {order.name} linked to this existing open case "
+                         f"instead of creating a duplicate"
+                )
+                order.message_post(
+                    body=f"Warning: {order.partner_id.name} already has open surgery case "
+                         f"{surgery_case.name} for {line.product_id.display_name}; "
+                         f"the line was linked to it and no new case was created."
+                )
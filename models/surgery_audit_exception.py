@@ -0,0 +1,223 @@
+from odoo import models, fields, api
+
+# rule -> (severity, SQL condition on surgery_case c, SQL message expression)
+# Conditions only read stored columns, so each rule is a single INSERT ... SELECT.
+AUDIT_RULES = {
+    'no_sale_order': (
+        'blocking',
+        "c.sale_order_id IS NULL",
+        "'No sales order linked'",
+    ),
+    'so_plan_mismatch': (
+        'blocking',
+        "c.sale_order_id IS NOT NULL"
+        " AND ABS(COALESCE(c.sale_order_total, 0) - COALESCE(c.payment_total_expected, 0)) > 0.01",
+        "format('Sales order total %%s differs from payment plan %%s',"
+        " COALESCE(c.sale_order_total, 0), COALESCE(c.payment_total_expected, 0))",
+    ),
+    'unpaid_balance': (
+        'warning',
+        "COALESCE(c.payment_total_received, 0) < COALESCE(c.payment_total_expected, 0) - 0.01",
+        "format('%%s still outstanding', COALESCE(c.payment_total_expected, 0) - COALESCE(c.payment_total_received, 0))",
+    ),
+    'unreconciled_insurance': (
+        'warning',
+        "EXISTS (SELECT 1 FROM surgery_payment_line l"
+        " WHERE l.surgery_case_id = c.id AND l.payment_source = 'insurance'"
+        " AND l.received_amount > 0 AND l.reconciliation_invoice_line_id IS NULL)",
+        "'Insurance payments received but not reconciled'",
+    ),
+    'claim_unresolved': (
+        'warning',
+        "c.insurance_company_id IS NOT NULL AND c.insurance_claim_status IN ('not_submitted', 'submitted')",
+        "'Insurance claim not resolved'",
+    ),
+    'medical_not_confirmed': (
+        'blocking',
+        "NOT COALESCE(c.medical_confirmed, FALSE)",
+        "'Medical clearance not confirmed'",
+    ),
+    'missing_calendar_event': (
+        'info',
+        "c.calendar_event_id IS NULL AND c.surgery_date IS NOT NULL",
+        "'No calendar event for the surgery'",
+    ),
+}
+
+FIXABLE_RULES = {'so_plan_mismatch', 'unpaid_balance', 'missing_calendar_event'}
+
+
+class SurgeryAuditException(models.Model):
+    _name = 'surgery.audit.exception'
+    _description = 'Surgery Audit Exception'
+    _order = 'severity_order, surgery_case_id, rule'
+
+    surgery_case_id = fields.Many2one(
+        'surgery.case',
+        string='Surgery Case',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    rule = fields.Selection([
+        ('no_sale_order', 'No Sales Order'),
+        ('so_plan_mismatch', 'SO / Payment Plan Mismatch'),
+        ('unpaid_balance', 'Unpaid Balance'),
+        ('unreconciled_insurance', 'Unreconciled Insurance Payment'),
+        ('claim_unresolved', 'Unresolved Insurance Claim'),
+        ('medical_not_confirmed', 'Medical Not Confirmed'),
+        ('missing_calendar_event', 'Missing Calendar Event')
+    ], string='Rule', required=True, readonly=True)
+
+    severity = fields.Selection([
+        ('blocking', 'Blocking'),
+        ('warning', 'Warning'),
+        ('info', 'Info')
+    ], string='Severity', required=True, readonly=True)
+
+    severity_order = fields.Integer(
+        compute='_compute_severity_order',
+        store=True
+    )
+
+    message = fields.Char(string='Details', readonly=True)
+
+    state = fields.Selection([
+        ('open', 'Open'),
+        ('ignored', 'Accepted')
+    ], default='open', required=True, string='Status')
+
+    fixable = fields.Boolean(
+        compute='_compute_fixable',
+        string='One-Click Fix'
+    )
+
+    partner_id = fields.Many2one(related='surgery_case_id.partner_id', string='Patient')
+    coordinator_id = fields.Many2one(related='surgery_case_id.coordinator_id', string='Coordinator')
+
+    _sql_constraints = [
+        ('case_rule_uniq', 'unique(surgery_case_id, rule)',
+         'A case can only have one exception per audit rule.'),
+    ]
+
+    @api.depends('severity')
+    def _compute_severity_order(self):
+        order = {'blocking': 1, 'warning': 2, 'info': 3}
+        for exception in self:
+            exception.severity_order = order.get(exception.severity, 9)
+
+    @api.depends('rule')
+    def _compute_fixable(self):
+        for exception in self:
+            exception.fixable = exception.rule in FIXABLE_RULES
+
+    @api.model
+    def _run_audit(self, domain=None):
+        """Audit the cases of a domain (default: the Audit stage) against every rule.
+
+        Open exceptions of the audited cases are replaced; accepted ones are
+        kept. Each rule is one INSERT ... SELECT over the whole set, so the
+        cost grows with the number of rules, not of cases.
+        """
+        if domain is None:
+            audit_stage = self.env.ref('hamarpea_odoo_surgery_coordination.stage_audit')
+            domain = [('stage_id', '=', audit_stage.id)]
+        case_ids = self.env['surgery.case'].search(domain).ids
+        if not case_ids:
+            return 0
+        self.env.flush_all()
+        cr = self.env.cr
+        cr.execute("""
+            DELETE FROM surgery_audit_exception
+             WHERE surgery_case_id = ANY(%s) AND state = 'open'
+        """, [case_ids])
+        severity_order = {'blocking': 1, 'warning': 2, 'info': 3}
+        created = 0
+        for rule, (severity, condition, message) in AUDIT_RULES.items():
+            cr.execute(f"""
+                INSERT INTO surgery_audit_exception (
+                    surgery_case_id, rule, severity, severity_order, message, state,
+                    create_uid, create_date, write_uid, write_date
+                )
+                SELECT c.id, %(rule)s, %(severity)s, %(severity_order)s, {message}, 'open',
+                       %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+                  FROM surgery_case c
+                 WHERE c.id = ANY(%(case_ids)s)
+                   AND {condition}
+            ON CONFLICT (surgery_case_id, rule) DO NOTHING
+            """, {
+                'rule': rule,
+                'severity': severity,
+                'severity_order': severity_order[severity],
+                'uid': self.env.uid,
+                'case_ids': case_ids,
+            })
+            created += cr.rowcount
+        self.invalidate_model()
+        return created
+
+    @api.model
+    def _cron_run_audit(self):
+        self._run_audit()
+
+    @api.model
+    def action_run_audit(self, case_ids=None):
+        count = self._run_audit([('id', 'in', case_ids)] if case_ids is not None else None)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Case Audit',
+                'message': f"{count} exception(s) found.",
+                'type': 'warning' if count else 'success',
+                'sticky': False,
+                'next': {'type': 'ir.actions.act_window_close'},
+            },
+        }
+
+    def action_ignore(self):
+        self.write({'state': 'ignored'})
+
+    def action_reopen(self):
+        self.write({'state': 'open'})
+
+    def action_fix(self):
+        """Apply the one-click fix of each exception, then re-audit the cases"""
+        by_rule = {}
+        for exception in self.filtered('fixable'):
+            by_rule.setdefault(exception.rule, self.env['surgery.case'])
+            by_rule[exception.rule] |= exception.surgery_case_id
+        for rule, cases in by_rule.items():
+            getattr(self, f'_fix_{rule}')(cases)
+        self._run_audit([('id', 'in', self.surgery_case_id.ids)])
+        return True
+
+    @api.model
+    def _fix_so_plan_mismatch(self, cases):
+        """Put the difference with the sales order on the client line"""
+        cases = cases.filtered('sale_order_id')._lock_cases(nowait=True)
+        vals_by_case = {}
+        for case in cases:
+            client_line = case.payment_line_ids.filtered(lambda l: l.payment_source == 'client')[:1]
+            diff = case.sale_order_total - case.payment_total_expected
+            vals_by_case[case.id] = {'expected_amount': (client_line.expected_amount or 0) + diff}
+        self.env['surgery.payment.line']._upsert_singleton_lines('client', vals_by_case)
+
+    @api.model
+    def _fix_unpaid_balance(self, cases):
+        cases.filtered('sale_order_id')._lock_cases(nowait=True)._sync_client_payments()
+
+    @api.model
+    def _fix_missing_calendar_event(self, cases):
+        cases = cases.filtered(lambda c: c.surgery_date and not c.calendar_event_id)
+        events = self.env['calendar.event'].create([{
+            'name': f"Surgery: {case.partner_id.name} ({case.name})",
+            'start_date': case.surgery_date,
+            'stop_date': case.surgery_date,
+            'allday': True,
+            'surgery_case_id': case.id,
+            'partner_ids': [(6, 0, case.surgeon_user_id.partner_id.ids)],
+        } for case in cases])
+        for case, event in zip(cases, events):
+            case.calendar_event_id = event
@@ -1,13 +1,46 @@
-from odoo import models, fields, api
+import json
+import logging
+import threading
+import time
+
+from odoo import models, fields, api, tools
 from odoo.exceptions import AccessError, UserError
+from odoo.tools.sql import create_index
+from .surgery_case_generation_job import CONCURRENCY_ERRORS
+from .surgery_fulltext import FTS_CONFIG, init_tsvector_column
+from .surgery_perf_log import surgery_timed
 from datetime import timedelta
 
+_logger = logging.getLogger(__name__)
+
+CENTER_PORTAL_PAGE_SIZE = 100
+# Writes to these fields can turn a case into an open duplicate
+DUPLICATE_KEY_FIELDS = {'partner_id', 'surgery_product_id', 'stage_id', 'active'}
+# Stages whose cases keep their fee snapshot
+FEE_LOCK_STAGES = ('stage_preop', 'stage_postop', 'stage_audit', 'stage_closed_won')
+CLOSED_RETENTION_PARAM = 'hamarpea_odoo_surgery_coordination.closed_case_retention_days'
+DEFERRAL_DAYS_PARAM = 'hamarpea_odoo_surgery_coordination.default_deferral_days'
+# Next action -> (priority, days before surgery it is due)
+NEXT_ACTION_RULES = {
+    'create_so': (1, 30),
+    'confirm_so': (2, 21),
+    'fix_payment_plan': (3, 21),
+    'submit_claim': (4, 14),
+    'collect_medical': (5, 10),
+    'review_medical': (6, 7),
+    'collect_payment': (7, 7),
+    'schedule_surgery': (8, None),
+}
+COORDINATOR_LOAD_CACHE_SECONDS = 60
+
 
 class SurgeryCase(models.Model):
     _name = 'surgery.case'
     _description = 'Surgery Case Management'
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'surgery.event.outbox.mixin']
     _order = 'surgery_date desc, id desc'
+    _outbox_fields = ('stage_id', 'medical_status', 'financial_status', 'ready_for_surgery')
+    _outbox_context_fields = ('name', 'surgicenter_id')
 
     # ==================== BASIC INFO ====================
     name = fields.Char(
@@ -33,6 +66,8 @@ class SurgeryCase(models.Model):
     patient_id_number = fields.Char(
         related='partner_id.vat',
         string='ID Number',
+        store=True,
+        index='trigram',
         readonly=True
     )
 
@@ -45,6 +80,8 @@ class SurgeryCase(models.Model):
     patient_phone = fields.Char(
         related='partner_id.phone',
         string='Patient Phone',
+        store=True,
+        index='trigram',
         readonly=True
     )
 
@@ -75,6 +112,20 @@ class SurgeryCase(models.Model):
         tracking=True
     )
 
+    lead_ids = fields.One2many(
+        'crm.lead',
+        'surgery_case_id',
+        string='Opportunities',
+        help='Consultation opportunities converted into this case'
+    )
+
+    fulltext_search = fields.Char(
+        string='Plan, Notes or References',
+        compute='_compute_fulltext_search',
+        search='_search_fulltext',
+        help='Full-text search over the surgery plan, checklist notes and payment references'
+    )
+
     surgery_product_id = fields.Many2one(
         'product.product',
         string='Primary Surgery Product',
@@ -117,6 +168,7 @@ class SurgeryCase(models.Model):
         'res.partner',
         string='Surgical Center',
         domain=[('account_type', '=', 'operating_room')],
+        index=True,
         tracking=True
     )
 
@@ -133,12 +185,34 @@ class SurgeryCase(models.Model):
         )
     )
 
+    deferred_until = fields.Date(
+        string='Deferred Until',
+        tracking=True,
+        copy=False,
+        help='A deferred case goes back to Planning on this date, with a follow-up activity for its coordinator; '
+             'filled from the default deferral period when left empty'
+    )
+
+    date_stage_entered = fields.Datetime(
+        string='In Stage Since',
+        default=fields.Datetime.now,
+        readonly=True,
+        copy=False,
+        index=True
+    )
+
     coordinator_id = fields.Many2one(
         'res.users',
         string='Coordinator',
         tracking=True
     )
 
+    stage_history_ids = fields.One2many(
+        'surgery.case.stage.history',
+        'surgery_case_id',
+        string='Stage History'
+    )
+
     # ==================== MEDICAL TRACK ====================
     medical_status = fields.Selection([
         ('pending', 'Pending'),
@@ -281,6 +355,33 @@ class SurgeryCase(models.Model):
     )
 
     # ==================== SURGICAL CENTER COMMISSION ====================
+    # Snapshot of the catalog at the time the procedure/center was chosen, so
+    # price list or center fee changes do not rewrite existing cases
+    surgeon_fee = fields.Monetary(
+        compute='_compute_fee_snapshot',
+        store=True,
+        readonly=False,
+        string='Surgeon Fee',
+        help='Procedure price captured from the product; refreshed only by "Reprice Open Cases"'
+    )
+
+    processing_fee_pct = fields.Float(
+        compute='_compute_fee_snapshot',
+        store=True,
+        readonly=False,
+        string='Processing Fee %',
+        digits=(5, 2),
+        help='Surgical center processing fee captured from the center'
+    )
+
+    fee_locked = fields.Boolean(
+        string='Fees Locked',
+        readonly=True,
+        copy=False,
+        tracking=True,
+        help='Set at SO confirmation or when the case reaches PreOp; repricing skips locked cases'
+    )
+
     expected_surgeon_payment = fields.Monetary(
         compute='_compute_expected_surgeon_payment',
         store=True,
@@ -309,6 +410,33 @@ class SurgeryCase(models.Model):
         help='Both medical and financial clearance complete'
     )
 
+    # ==================== WORK QUEUE ====================
+    next_action = fields.Selection([
+        ('none', 'Nothing Pending'),
+        ('create_so', 'Create Sales Order'),
+        ('confirm_so', 'Confirm Sales Order'),
+        ('fix_payment_plan', 'Fix Payment Plan'),
+        ('submit_claim', 'Submit Insurance Claim'),
+        ('collect_medical', 'Collect Medical Items'),
+        ('review_medical', 'Review Medical Results'),
+        ('collect_payment', 'Collect Deposit'),
+        ('schedule_surgery', 'Schedule Surgery')
+    ], compute='_compute_next_action', store=True, index=True, string='Next Action',
+        help='What is currently blocking the case')
+
+    next_action_due = fields.Date(
+        compute='_compute_next_action',
+        store=True,
+        string='Next Action Due',
+        help='Derived from the surgery date and the lead time the action needs'
+    )
+
+    next_action_priority = fields.Integer(
+        compute='_compute_next_action',
+        store=True,
+        string='Next Action Priority'
+    )
+
     # ==================== CALENDAR ====================
     calendar_event_id = fields.Many2one(
         'calendar.event',
@@ -456,18 +584,50 @@ class SurgeryCase(models.Model):
             else:
                 record.surgery_product_privilege_warning = False
 
-    @api.depends('surgery_product_id.list_price', 'surgicenter_id.processing_fee_pct',
-                 'surgery_location')
+    @api.depends('surgery_product_id', 'surgicenter_id', 'surgery_location')
+    def _compute_fee_snapshot(self):
+        """Capture fee and processing % from the catalog when the case's own choices change.
+
+        Deliberately not depending on list_price/processing_fee_pct: catalog
+        updates must not recompute every linked case. Saved locked cases
+        keep their snapshot, even a zero fee.
+        """
+        for record in self:
+            origin = record._origin
+            if record.fee_locked and origin.id:
+                record.surgeon_fee = origin.surgeon_fee
+                record.processing_fee_pct = origin.processing_fee_pct
+                continue
+            record.surgeon_fee, record.processing_fee_pct = record._get_catalog_fees()
+
+    @api.model
+    def _get_fee_lock_stages(self):
+        """Stages that freeze the fee snapshot; Deferred and Closed-Lost do not"""
+        stages = [
+            self.env.ref(f'hamarpea_odoo_surgery_coordination.{xmlid}', raise_if_not_found=False)
+            for xmlid in FEE_LOCK_STAGES
+        ]
+        return self.env['surgery.stage'].union(*filter(None, stages))
+
+    def _get_catalog_fees(self):
+        """Current (fee, processing %) from the product and surgical center"""
+        self.ensure_one()
+        fee = self.surgery_product_id.list_price if self.surgery_product_id else 0.0
+        if self.surgery_location == 'external' and self.surgicenter_id:
+            return fee, self.surgicenter_id.processing_fee_pct or 0.0
+        return fee, 0.0
+
+    @api.depends('surgeon_fee', 'processing_fee_pct', 'surgicenter_id', 'surgery_location')
     def _compute_expected_surgeon_payment(self):
         for record in self:
             if record.surgery_location == 'external' and record.surgicenter_id and record.surgery_product_id:
-                base_fee = record.surgery_product_id.list_price
-                processing_pct = record.surgicenter_id.processing_fee_pct or 0
+                base_fee = record.surgeon_fee
+                processing_pct = record.processing_fee_pct or 0
                 record.processing_fee_amount = base_fee * (processing_pct / 100)
                 record.expected_surgeon_payment = base_fee - record.processing_fee_amount
             else:
                 if record.surgery_product_id:
-                    record.expected_surgeon_payment = record.surgery_product_id.list_price
+                    record.expected_surgeon_payment = record.surgeon_fee
                 else:
                     record.expected_surgeon_payment = 0
                 record.processing_fee_amount = 0
@@ -537,8 +697,67 @@ class SurgeryCase(models.Model):
                 record.payment_plan_valid = True
                 record.payment_plan_warning = ""
 
+    @api.depends('stage_id.fold', 'so_status', 'payment_plan_valid', 'insurance_company_id',
+                 'insurance_claim_status', 'medical_status', 'financial_status',
+                 'ready_for_surgery', 'surgery_date')
+    def _compute_next_action(self):
+        for record in self:
+            if record.stage_id.fold:
+                action = 'none'
+            elif record.so_status == 'no_so':
+                action = 'create_so'
+            elif record.so_status == 'draft':
+                action = 'confirm_so'
+            elif not record.payment_plan_valid:
+                action = 'fix_payment_plan'
+            elif record.insurance_company_id and record.insurance_claim_status == 'not_submitted':
+                action = 'submit_claim'
+            elif record.medical_status in ['pending', 'in_progress']:
+                action = 'collect_medical'
+            elif record.medical_status == 'review_needed':
+                action = 'review_medical'
+            elif record.financial_status != 'approved':
+                action = 'collect_payment'
+            elif record.ready_for_surgery and not record.surgery_date:
+                action = 'schedule_surgery'
+            else:
+                action = 'none'
+
+            priority, lead_days = NEXT_ACTION_RULES.get(action, (0, None))
+            record.next_action = action
+            record.next_action_priority = priority
+            if record.surgery_date and lead_days is not None:
+                record.next_action_due = record.surgery_date - timedelta(days=lead_days)
+            else:
+                record.next_action_due = False
+
+    def _compute_fulltext_search(self):
+        self.fulltext_search = False
+
+    def _search_fulltext(self, operator, value):
+        """Match cases whose plan, checklist notes or payment references
+        contain the words, through the tsvector GIN indexes"""
+        if operator not in ('ilike', '=') or not value:
+            raise UserError("Full-text search only supports matching words.")
+        self.env['surgery.medical.item'].flush_model(['notes'])
+        self.env['surgery.payment.line'].flush_model(['reference'])
+        self.flush_model(['surgery_plan'])
+        # Kept as a subquery, so common words never build a long id list
+        return [('id', 'in', tools.SQL(
+            """
+            WITH q AS (SELECT websearch_to_tsquery(%s, %s) AS query)
+            SELECT c.id FROM surgery_case c, q WHERE c.surgery_plan_tsv @@ q.query
+             UNION
+            SELECT m.surgery_case_id FROM surgery_medical_item m, q WHERE m.notes_tsv @@ q.query
+             UNION
+            SELECT l.surgery_case_id FROM surgery_payment_line l, q WHERE l.reference_tsv @@ q.query
+            """,
+            FTS_CONFIG, value,
+        ))]
+
     # ==================== ACTIONS ====================
 
+    @surgery_timed('surgery.case.action_confirm_medical')
     def action_confirm_medical(self):
         """Nurse or Doctor confirms medical clearance"""
         self.ensure_one()
@@ -578,6 +797,7 @@ class SurgeryCase(models.Model):
             'target': 'current',
         }
 
+    @surgery_timed('surgery.case.action_sync_client_payments')
     def action_sync_client_payments(self):
         """Sync client payment lines from invoice payments.
 
@@ -588,9 +808,18 @@ class SurgeryCase(models.Model):
         if not self.sale_order_id:
             raise UserError("No Sale Order linked to this surgery case.")
 
-        PaymentLine = self.env['surgery.payment.line']
+        # Fails fast with a retryable error while a sync cron holds the case
+        self._lock_cases(nowait=True)
+        result = self._sync_client_payments()[self.id]
+        if result == 'no_payments':
+            self.message_post(body="No payments found on linked invoices")
+        elif result == 'unchanged':
+            self.message_post(body="No new payments to sync")
+        return True
 
-        # Collect all payment amounts from SO invoices
+    def _collect_client_payments(self):
+        """Return (total received, latest payment date, references) from the SO invoices"""
+        self.ensure_one()
         synced_payment_ids = set()
         total_received = 0
         latest_date = False
@@ -610,72 +839,167 @@ class SurgeryCase(models.Model):
                             latest_date = payment.date
                         if payment.name:
                             references.append(payment.name)
+        return total_received if synced_payment_ids else None, latest_date, references
 
-        if not synced_payment_ids:
-            self.message_post(body="No payments found on linked invoices")
-            return True
-
-        # Find or create the client payment line
-        client_line = PaymentLine.search([
-            ('surgery_case_id', '=', self.id),
-            ('payment_source', '=', 'client'),
-        ], limit=1)
-
-        if client_line:
-            old_received = client_line.received_amount or 0
-            if abs(total_received - old_received) < 0.01:
-                self.message_post(body="No new payments to sync")
-                return True
-            # Update existing line
-            vals = {
+    def _sync_client_payments(self):
+        """Sync the client payment line of several cases at once.
+
+        The cases must be row-locked by the caller. Returns a dict mapping
+        case ids to 'no_payments', 'unchanged' or 'synced'.
+        """
+        results = {}
+        vals_by_case = {}
+        create_vals_by_case = {}
+        for case in self:
+            total_received, latest_date, references = case._collect_client_payments()
+            if total_received is None:
+                results[case.id] = 'no_payments'
+                continue
+            client_line = case.payment_line_ids.filtered(lambda l: l.payment_source == 'client')[:1]
+            if client_line and abs(total_received - (client_line.received_amount or 0)) < 0.01:
+                results[case.id] = 'unchanged'
+                continue
+            vals_by_case[case.id] = {
                 'received_amount': total_received,
                 'payment_date': latest_date,
                 'reference': ', '.join(references),
             }
-            # Auto-set status based on amounts
-            if total_received >= (client_line.expected_amount or 0):
-                vals['status'] = 'paid'
-            elif total_received > 0:
-                vals['status'] = 'partial'
-            client_line.write(vals)
-        else:
-            # No client line exists — create one
-            status = 'paid' if total_received >= self.sale_order_total else 'partial'
-            PaymentLine.create({
-                'surgery_case_id': self.id,
-                'payment_source': 'client',
-                'expected_amount': self.sale_order_total,
-                'received_amount': total_received,
-                'payment_date': latest_date,
-                'reference': ', '.join(references),
-                'status': status,
-            })
+            create_vals_by_case[case.id] = {'expected_amount': case.sale_order_total}
+            results[case.id] = 'synced'
 
-        self.message_post(body=f"Synced client payments: received {self.currency_id.symbol}{total_received:,.2f}")
-        return True
+        if vals_by_case:
+            self.env['surgery.payment.line']._upsert_singleton_lines('client', vals_by_case, create_vals_by_case)
+            for case in self.browse(list(vals_by_case)):
+                total_received = vals_by_case[case.id]['received_amount']
+                case.message_post(body=f"Synced client payments: received {case.currency_id.symbol}{total_received:,.2f}")
+        return results
+
+    def _lock_cases(self, nowait=False, skip_locked=False):
+        """Row-lock cases before touching their client or surgicenter lines.
+
+        With skip_locked, cases held by another transaction are left out of
+        the returned recordset, so parallel workers sync disjoint batches.
+        """
+        if not self:
+            return self
+        mode = 'SKIP LOCKED' if skip_locked else 'NOWAIT' if nowait else ''
+        self.env.cr.execute(
+            f"SELECT id FROM surgery_case WHERE id IN %s ORDER BY id FOR UPDATE {mode}",
+            [tuple(self.ids)],
+        )
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+
+    @api.model
+    def _cron_sync_client_payments(self, batch_size=200):
+        """Sync client payments of open cases with a sales order, batch by batch.
+
+        Cases are claimed with SKIP LOCKED, so any number of workers (or a
+        coordinator syncing by hand) can run alongside without waiting on
+        each other; skipped cases are picked up by the next run.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        last_id = 0
+        while True:
+            self.env.cr.execute("""
+                SELECT c.id
+                  FROM surgery_case c
+                  JOIN surgery_stage s ON s.id = c.stage_id
+                 WHERE c.active
+                   AND c.sale_order_id IS NOT NULL
+                   AND NOT COALESCE(s.is_closed, FALSE)
+                   AND c.id > %s
+              ORDER BY c.id
+                 LIMIT %s
+                   FOR UPDATE OF c SKIP LOCKED
+            """, [last_id, batch_size])
+            cases = self.browse([row[0] for row in self.env.cr.fetchall()])
+            if not cases:
+                break
+            last_id = cases.ids[-1]
+            try:
+                with self.env.cr.savepoint():
+                    cases._sync_client_payments()
+            except CONCURRENCY_ERRORS:
+                if not auto_commit:
+                    raise
+                self.env.cr.rollback()
+                break
+            except Exception:
+                _logger.exception("Client payment sync failed for cases %s", cases.ids)
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+
+    def action_reprice_open_cases(self):
+        """Refresh fee snapshots of open, unlocked cases from the current catalog.
+
+        Works on the selected cases, or on every open case when called
+        without a selection. Cases are grouped by their new fees so the
+        update is a handful of batched writes.
+        """
+        domain = [
+            ('fee_locked', '=', False),
+            ('stage_id.is_closed', '=', False),
+            ('surgery_product_id', '!=', False),
+        ]
+        cases = self.filtered_domain(domain) if self else self.search(domain)
+        cases.fetch(['surgery_product_id', 'surgicenter_id', 'surgery_location',
+                     'surgeon_fee', 'processing_fee_pct'])
+
+        to_update = {}
+        for case in cases:
+            fees = case._get_catalog_fees()
+            if fees != (case.surgeon_fee, case.processing_fee_pct):
+                to_update.setdefault(fees, self.browse())
+                to_update[fees] |= case
+
+        for (fee, pct), group in to_update.items():
+            group.write({'surgeon_fee': fee, 'processing_fee_pct': pct})
+
+        repriced = sum(len(group) for group in to_update.values())
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Reprice Open Cases',
+                'message': f"{repriced} of {len(cases)} open case(s) repriced from the current catalog.",
+                'type': 'success' if repriced else 'info',
+                'sticky': False,
+            },
+        }
 
     def _ensure_surgicenter_line(self):
-        """Create or update surgicenter payment line for external surgeries"""
+        """Create or update surgicenter payment line for external surgeries.
+
+        The cases are row-locked first, like the client sync, so two
+        concurrent writes cannot both create a line for the same case.
+        """
+        cases = self._lock_cases()
         PaymentLine = self.env['surgery.payment.line']
-        for record in self:
-            existing = PaymentLine.search([
-                ('surgery_case_id', '=', record.id),
+        existing_by_case = {
+            line.surgery_case_id.id: line
+            for line in PaymentLine.search([
+                ('surgery_case_id', 'in', cases.ids),
                 ('payment_source', '=', 'surgicenter')
-            ], limit=1)
+            ])
+        }
 
+        vals_by_case = {}
+        to_unlink = PaymentLine
+        for record in cases:
+            existing = existing_by_case.get(record.id, PaymentLine)
             if record.surgery_location == 'external' and record.surgicenter_id:
-                if not existing:
-                    PaymentLine.create({
-                        'surgery_case_id': record.id,
-                        'payment_source': 'surgicenter',
-                        'partner_id': record.surgicenter_id.id,
-                    })
-                else:
-                    existing.partner_id = record.surgicenter_id.id
+                if existing.partner_id != record.surgicenter_id:
+                    vals_by_case[record.id] = {'partner_id': record.surgicenter_id.id}
             elif existing:
                 # Remove surgicenter line if no longer external
-                existing.unlink()
+                to_unlink |= existing
+
+        if vals_by_case:
+            PaymentLine._upsert_singleton_lines('surgicenter', vals_by_case)
+        to_unlink.unlink()
 
+    @surgery_timed('surgery.case.action_create_medical_checklist')
     def action_create_medical_checklist(self):
         """Manually create/recreate medical checklist items based on patient age"""
         self.ensure_one()
@@ -690,8 +1014,6 @@ class SurgeryCase(models.Model):
 
     def _create_medical_checklist_items(self):
         """Create medical checklist items based on patient age"""
-        self.ensure_one()
-
         # Standard items for all patients
         standard_items = [
             'blood_count',
@@ -702,54 +1024,505 @@ class SurgeryCase(models.Model):
             'gp_consent'
         ]
 
-        # Age-based items
-        age = self.patient_age
-        age_based_items = []
-
-        if age >= 40:
-            age_based_items.append('ecg')
+        vals_list = []
+        for record in self:
+            # Age-based items
+            age = record.patient_age
+            age_based_items = []
 
-        if age >= 60:
-            age_based_items.append('chest_xray')
+            if age >= 40:
+                age_based_items.append('ecg')
 
-        all_items = standard_items + age_based_items
+            if age >= 60:
+                age_based_items.append('chest_xray')
 
-        # Create the items
-        MedicalItem = self.env['surgery.medical.item']
-        for test_type in all_items:
-            MedicalItem.create({
-                'surgery_case_id': self.id,
+            vals_list.extend({
+                'surgery_case_id': record.id,
                 'test_type': test_type,
                 'status': 'awaited'
-            })
+            } for test_type in standard_items + age_based_items)
+
+        # Create the items for the whole batch at once
+        self.env['surgery.medical.item'].create(vals_list)
 
     # ==================== LIFECYCLE ====================
 
-    @api.model
-    def create(self, vals):
-        if vals.get('name', 'New') == 'New':
-            vals['name'] = self.env['ir.sequence'].next_by_code('surgery.case') or 'New'
+    def init(self):
+        super().init()
+        # Work queue: pending actions ordered by urgency
+        create_index(
+            self.env.cr,
+            'surgery_case_work_queue_index',
+            self._table,
+            ['next_action_due', 'next_action_priority'],
+            where="active AND next_action != 'none'",
+        )
+        # Backs the open-duplicate lookup on (patient, procedure)
+        create_index(
+            self.env.cr,
+            'surgery_case_partner_product_active_index',
+            self._table,
+            ['partner_id', 'surgery_product_id'],
+            where='active',
+        )
+        # Daily reactivation sweep over deferred cases
+        create_index(
+            self.env.cr,
+            'surgery_case_deferred_until_index',
+            self._table,
+            ['deferred_until'],
+            where='active AND deferred_until IS NOT NULL',
+        )
+        init_tsvector_column(self.env.cr, self._table, 'surgery_plan_tsv', 'surgery_plan')
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        for vals in vals_list:
+            if vals.get('name', 'New') == 'New':
+                vals['name'] = self.env['ir.sequence'].next_by_code('surgery.case') or 'New'
 
-        record = super().create(vals)
+        if not self.env.context.get('surgery_allow_duplicate'):
+            self._check_open_duplicates(vals_list)
+
+        if not self.env.context.get('surgery_no_auto_assign'):
+            self._assign_coordinators(vals_list)
+
+        deferred = self.env.ref('hamarpea_odoo_surgery_coordination.stage_deferred', raise_if_not_found=False)
+        for vals in vals_list:
+            if deferred and vals.get('stage_id') == deferred.id and not vals.get('deferred_until'):
+                vals['deferred_until'] = self._get_default_deferred_until()
+
+        records = super().create(vals_list)
 
         # Auto-create medical checklist items
-        record._create_medical_checklist_items()
+        records._create_medical_checklist_items()
 
         # Auto-create surgicenter line if external surgery
-        record._ensure_surgicenter_line()
+        records._ensure_surgicenter_line()
 
-        return record
+        # Open the stage ledger
+        self.env['surgery.case.stage.history']._record_stage_change(records)
+
+        return records
+
+    def copy(self, default=None):
+        # A copy starts out as a duplicate of its original by design
+        copies = super(SurgeryCase, self.with_context(surgery_allow_duplicate=True)).copy(default)
+        return copies.with_env(self.env)
 
     def write(self, vals):
+        if DUPLICATE_KEY_FIELDS & set(vals) and not self.env.context.get('surgery_allow_duplicate'):
+            self._check_write_duplicates(vals)
+
+        stage_changed = self.browse()
+        if 'stage_id' in vals:
+            stage_changed = self.filtered(lambda c: c.stage_id.id != vals['stage_id'])
+            # Stamped in the same write; only a mixed batch needs a second one
+            if stage_changed and stage_changed == self:
+                vals = {**vals, 'date_stage_entered': fields.Datetime.now()}
+
         result = super().write(vals)
 
+        # Append to the stage ledger for every case that actually moved
+        if stage_changed:
+            if 'date_stage_entered' not in vals:
+                super(SurgeryCase, stage_changed).write({'date_stage_entered': fields.Datetime.now()})
+            self.env['surgery.case.stage.history']._record_stage_change(stage_changed)
+
+            # Deferred cases always get a date to come back on
+            deferred = self.env.ref('hamarpea_odoo_surgery_coordination.stage_deferred', raise_if_not_found=False)
+            undated = stage_changed.filtered(lambda c: c.stage_id == deferred and not c.deferred_until)
+            if undated:
+                super(SurgeryCase, undated).write({'deferred_until': self._get_default_deferred_until()})
+
+            # Freeze fees once a case reaches PreOp or a later stage on the way to surgery
+            lock_stages = self._get_fee_lock_stages()
+            stage_changed.filtered(
+                lambda c: not c.fee_locked and c.stage_id in lock_stages
+            ).write({'fee_locked': True})
+
         # Auto-create/update surgicenter line if surgery location or surgicenter changed
         if 'surgery_location' in vals or 'surgicenter_id' in vals:
             self._ensure_surgicenter_line()
 
+        # Payment projections are based on the surgery date
+        if 'surgery_date' in vals:
+            self.payment_line_ids.filtered(lambda l: not l.projection_stale).write({'projection_stale': True})
+
         return result
 
     @api.model
     def _read_group_stage_ids(self, stages, domain):
         """Show all stages in kanban view"""
         return stages.search([], order='sequence, id')
+
+    # ==================== DUPLICATE DETECTION ====================
+
+    @api.model
+    def _find_open_duplicates(self, pairs, exclude_ids=()):
+        """Map (partner_id, product_id) pairs to the oldest open case for each.
+
+        A case is open when it is active and not in a closing stage. The
+        whole batch is resolved with a single query on the composite index;
+        cases in exclude_ids are ignored.
+        """
+        pairs = {pair for pair in pairs if pair[0] and pair[1]}
+        if not pairs:
+            return {}
+        self.flush_model(['partner_id', 'surgery_product_id', 'stage_id', 'active'])
+        self.env['surgery.stage'].flush_model(['is_closed'])
+        self.env.cr.execute("""
+            SELECT c.partner_id, c.surgery_product_id, MIN(c.id)
+              FROM surgery_case c
+              JOIN surgery_stage s ON s.id = c.stage_id
+             WHERE c.active
+               AND NOT COALESCE(s.is_closed, FALSE)
+               AND (c.partner_id, c.surgery_product_id) IN %s
+               AND c.id != ALL(%s)
+          GROUP BY c.partner_id, c.surgery_product_id
+        """, [tuple(pairs), list(exclude_ids)])
+        return {(partner_id, product_id): case_id for partner_id, product_id, case_id in self.env.cr.fetchall()}
+
+    @api.model
+    def _check_open_duplicates(self, vals_list, exclude_ids=()):
+        """Block creating a second open case for the same patient and procedure"""
+        closed_stage_ids = set(self.env['surgery.stage'].search([('is_closed', '=', True)]).ids)
+        pairs = [
+            (vals.get('partner_id'), vals.get('surgery_product_id'))
+            for vals in vals_list
+            if vals.get('stage_id') not in closed_stage_ids and vals.get('active', True)
+        ]
+        # Duplicates within the batch itself
+        seen, clashes = set(), set()
+        for pair in pairs:
+            if pair[0] and pair[1] and pair in seen:
+                clashes.add(pair)
+            seen.add(pair)
+        existing = self._find_open_duplicates(pairs, exclude_ids)
+        clashes |= set(existing)
+        if not clashes:
+            return
+
+        details = []
+        for partner_id, product_id in sorted(clashes):
+            line = (f"- {self.env['res.partner'].browse(partner_id).name} / "
+                    f"{self.env['product.product'].browse(product_id).display_name}")
+            if (partner_id, product_id) in existing:
+                line += f" (open case {self.browse(existing[partner_id, product_id]).name})"
+            details.append(line)
+        raise UserError(
+            "An open surgery case already exists for this patient and procedure:\n" +
+            "\n".join(details)
+        )
+
+    def _check_write_duplicates(self, vals):
+        """Run the duplicate check on cases a write reopens or re-points.
+
+        Only cases that were not open on the same patient and procedure
+        before the write are checked, so ordinary stage moves of legacy
+        duplicates still go through.
+        """
+        closed_stage_ids = set(self.env['surgery.stage'].search([('is_closed', '=', True)]).ids)
+        vals_list = []
+        for case in self:
+            new_vals = {
+                'partner_id': vals.get('partner_id', case.partner_id.id),
+                'surgery_product_id': vals.get('surgery_product_id', case.surgery_product_id.id),
+                'stage_id': vals.get('stage_id', case.stage_id.id),
+                'active': vals.get('active', case.active),
+            }
+            was_open = case.active and case.stage_id.id not in closed_stage_ids
+            same_pair = (new_vals['partner_id'], new_vals['surgery_product_id']) == \
+                (case.partner_id.id, case.surgery_product_id.id)
+            if not (was_open and same_pair):
+                vals_list.append(new_vals)
+        if vals_list:
+            self._check_open_duplicates(vals_list, exclude_ids=self.ids)
+
+    @api.model
+    def action_view_open_duplicates(self):
+        """Cleanup report: open cases sharing patient and procedure with another open case"""
+        self.flush_model(['partner_id', 'surgery_product_id', 'stage_id', 'active'])
+        self.env.cr.execute("""
+            SELECT id FROM (
+                SELECT c.id, COUNT(*) OVER (PARTITION BY c.partner_id, c.surgery_product_id) AS cnt
+                  FROM surgery_case c
+                  JOIN surgery_stage s ON s.id = c.stage_id
+                 WHERE c.active
+                   AND NOT COALESCE(s.is_closed, FALSE)
+                   AND c.surgery_product_id IS NOT NULL
+            ) dup
+             WHERE dup.cnt > 1
+        """)
+        duplicate_ids = [row[0] for row in self.env.cr.fetchall()]
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Duplicate Open Cases',
+            'res_model': 'surgery.case',
+            'view_mode': 'list,form',
+            'views': [(False, 'list'), (False, 'form')],
+            'domain': [('id', 'in', duplicate_ids)],
+            'context': {'group_by': ['partner_id', 'surgery_product_id']},
+        }
+
+    # ==================== COORDINATOR ASSIGNMENT ====================
+
+    @api.model
+    def _coordinator_load_weight(self, surgery_date, today):
+        """Weight of one open case in a coordinator's load; imminent surgeries count more"""
+        if not surgery_date:
+            return 1.0
+        days = (surgery_date - today).days
+        if days < 0:
+            return 0.5
+        if days <= 7:
+            return 3.0
+        if days <= 30:
+            return 2.0
+        return 1.0
+
+    @api.model
+    def _get_coordinator_loads(self):
+        """Weighted open-case load per coordinator, as {user_id: load}.
+
+        Computed with one grouped query over cases outside folded stages and
+        kept on the cursor for a short while, so a burst of creations reuses
+        it and keeps it up to date as cases get assigned.
+        """
+        cached = self.env.cr.cache.get('surgery_coordinator_loads')
+        if cached and time.monotonic() - cached[0] < COORDINATOR_LOAD_CACHE_SECONDS:
+            return cached[1]
+
+        coordinators = self.env.ref(
+            'hamarpea_odoo_surgery_coordination.group_surgery_coordinator',
+            raise_if_not_found=False
+        )
+        users = coordinators.users.filtered('active') if coordinators else self.env['res.users']
+        loads = dict.fromkeys(users.ids, 0.0)
+        if users:
+            today = fields.Date.context_today(self)
+            groups = self.sudo()._read_group(
+                [('coordinator_id', 'in', users.ids), ('stage_id.fold', '=', False)],
+                ['coordinator_id', 'surgery_date:day'],
+                ['__count'],
+            )
+            for coordinator, day, count in groups:
+                loads[coordinator.id] += count * self._coordinator_load_weight(day, today)
+        self.env.cr.cache['surgery_coordinator_loads'] = (time.monotonic(), loads)
+        return loads
+
+    @api.model
+    def _assign_coordinators(self, vals_list):
+        """Give every new case without a coordinator to the least loaded one.
+
+        Until the Surgery Coordinator group has members, new cases are left
+        without a coordinator.
+        """
+        pending = [vals for vals in vals_list if not vals.get('coordinator_id')]
+        if not pending:
+            return
+        loads = self._get_coordinator_loads()
+        if not loads:
+            _logger.info(
+                "No active member in the Surgery Coordinator group; "
+                "%s new surgery case(s) left without a coordinator", len(pending)
+            )
+            return
+        today = fields.Date.context_today(self)
+        for vals in pending:
+            user_id = min(loads, key=lambda uid: (loads[uid], uid))
+            vals['coordinator_id'] = user_id
+            surgery_date = fields.Date.to_date(vals.get('surgery_date'))
+            loads[user_id] += self._coordinator_load_weight(surgery_date, today)
+
+    # ==================== BATCH HELPERS ====================
+
+    @api.model
+    def _iter_id_chunks(self, domain, chunk_size=1000):
+        """Yield cases matching domain in id-ordered chunks.
+
+        The cache is flushed and cleared between chunks so memory stays flat
+        regardless of how many cases match.
+        """
+        last_id = 0
+        while True:
+            chunk = self.search(domain + [('id', '>', last_id)], order='id', limit=chunk_size)
+            if not chunk:
+                break
+            yield chunk
+            last_id = chunk[-1].id
+            self.env.invalidate_all()
+
+    # ==================== DEFERRAL AND RETENTION ====================
+
+    @api.model
+    def _get_default_deferred_until(self):
+        """Date a case entering Deferred without one comes back to Planning"""
+        days = int(self.env['ir.config_parameter'].sudo().get_param(DEFERRAL_DAYS_PARAM, 90))
+        return fields.Date.context_today(self) + timedelta(days=max(days, 1))
+
+    @api.model
+    def _cron_reactivate_deferred(self):
+        """Send deferred cases whose date has come back to Planning.
+
+        The due cases are found on the partial deferred_until index, moved
+        with one write and given their follow-up activities with one create.
+        """
+        deferred = self.env.ref('hamarpea_odoo_surgery_coordination.stage_deferred')
+        planning = self.env.ref('hamarpea_odoo_surgery_coordination.stage_planning')
+        today = fields.Date.context_today(self)
+        cases = self.search([
+            ('stage_id', '=', deferred.id),
+            ('deferred_until', '<=', today),
+        ])
+        if not cases:
+            return
+        reasons = {case.id: case.deferred_until for case in cases}
+        cases.write({'stage_id': planning.id, 'deferred_until': False})
+
+        activity_type = self.env.ref('mail.mail_activity_data_todo', raise_if_not_found=False)
+        model_id = self.env['ir.model']._get_id(self._name)
+        self.env['mail.activity'].create([{
+            'res_model_id': model_id,
+            'res_id': case.id,
+            'activity_type_id': activity_type.id if activity_type else False,
+            'summary': 'Follow up on reactivated case',
+            'note': f"Deferred until {reasons[case.id]}; the case is back in Planning.",
+            'date_deadline': today,
+            'user_id': (case.coordinator_id or case.surgeon_user_id or case.create_uid).id,
+        } for case in cases])
+        _logger.info("Reactivated %s deferred surgery case(s)", len(cases))
+
+    @api.model
+    def _cron_archive_closed_cases(self, chunk_size=1000):
+        """Archive Closed-Won and Closed-Lost cases past the retention period.
+
+        Works in id-ordered chunks, committing after each, so a large
+        backlog never holds locks on thousands of cases at once. A chunk
+        that fails is logged and skipped until the next run. Archived cases
+        still count in surgicenter statements but leave the center portal.
+        """
+        days = int(self.env['ir.config_parameter'].sudo().get_param(CLOSED_RETENTION_PARAM, 365))
+        if days <= 0:
+            return
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        cutoff = fields.Datetime.now() - timedelta(days=days)
+        domain = [
+            ('stage_id.is_closed', '=', True),
+            '|', ('date_stage_entered', '<', cutoff),
+            '&', ('date_stage_entered', '=', False), ('write_date', '<', cutoff),
+        ]
+        archived = 0
+        last_id = 0
+        while True:
+            chunk = self.search(domain + [('id', '>', last_id)], order='id', limit=chunk_size)
+            if not chunk:
+                break
+            last_id = chunk.ids[-1]
+            try:
+                with self.env.cr.savepoint():
+                    chunk.write({'active': False})
+                archived += len(chunk)
+            except Exception:
+                _logger.exception("Archiving closed surgery cases %s failed", chunk.ids)
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+        if archived:
+            _logger.info("Archived %s closed surgery case(s)", archived)
+
+    # ==================== SURGICAL CENTER PORTAL ====================
+
+    @api.model
+    def _get_center_portal_stamp(self, center_id):
+        """Return (last write_date, case count, line count, line id sum) for a center.
+
+        Used as the cache key and validator for the center portal, so it must
+        stay a single cheap indexed query. Only active cases are listed:
+        closed cases archived after the retention period leave the portal. The write_date also covers the
+        patient, stage, surgeon and procedure shown in the payload, and the
+        line count and id sum change when a payment line is deleted.
+        """
+        self.env['surgery.case'].flush_model([
+            'surgicenter_id', 'active', 'partner_id', 'stage_id',
+            'surgeon_employee_id', 'surgery_product_id',
+        ])
+        self.env['surgery.payment.line'].flush_model(['surgery_case_id', 'partner_id'])
+        for model in ('res.partner', 'surgery.stage', 'hr.employee', 'product.product', 'product.template'):
+            self.env[model].flush_model(['write_date'])
+        self.env.cr.execute("""
+            SELECT GREATEST(
+                       MAX(c.write_date), MAX(l.write_date), MAX(p.write_date), MAX(s.write_date),
+                       MAX(e.write_date), MAX(pp.write_date), MAX(pt.write_date)
+                   ),
+                   COUNT(DISTINCT c.id),
+                   COUNT(DISTINCT l.id),
+                   COALESCE(SUM(DISTINCT l.id), 0)
+              FROM surgery_case c
+         LEFT JOIN surgery_payment_line l
+                ON l.surgery_case_id = c.id AND l.partner_id = c.surgicenter_id
+         LEFT JOIN res_partner p ON p.id = c.partner_id
+         LEFT JOIN surgery_stage s ON s.id = c.stage_id
+         LEFT JOIN hr_employee e ON e.id = c.surgeon_employee_id
+         LEFT JOIN product_product pp ON pp.id = c.surgery_product_id
+         LEFT JOIN product_template pt ON pt.id = pp.product_tmpl_id
+             WHERE c.surgicenter_id = %s AND c.active
+        """, [center_id])
+        return self.env.cr.fetchone()
+
+    @api.model
+    @tools.ormcache('center_id', 'page', 'stamp', 'self.env.lang')
+    def _get_center_portal_payload(self, center_id, page, stamp):
+        """Serialized page of a center's cases with their surgicenter payment lines.
+
+        Cached per center, page and language; the stamp changes whenever a
+        case, a line or a record shown for a case is written, and when a
+        line is deleted, which naturally retires stale entries.
+        """
+        cases = self.sudo().search_read(
+            [('surgicenter_id', '=', center_id)],
+            ['name', 'partner_id', 'surgery_date', 'stage_id', 'surgeon_employee_id',
+             'surgery_product_id', 'expected_surgeon_payment', 'processing_fee_amount',
+             'currency_id'],
+            offset=page * CENTER_PORTAL_PAGE_SIZE,
+            limit=CENTER_PORTAL_PAGE_SIZE,
+        )
+        lines = self.env['surgery.payment.line'].sudo().search_read(
+            [('surgery_case_id', 'in', [case['id'] for case in cases]),
+             ('partner_id', '=', center_id)],
+            ['surgery_case_id', 'expected_amount', 'received_amount', 'balance',
+             'status', 'reference', 'payment_date'],
+        )
+        lines_by_case = {}
+        for line in lines:
+            lines_by_case.setdefault(line['surgery_case_id'][0], []).append({
+                'expected_amount': line['expected_amount'],
+                'received_amount': line['received_amount'],
+                'balance': line['balance'],
+                'status': line['status'],
+                'reference': line['reference'] or '',
+                'payment_date': fields.Date.to_string(line['payment_date']) or None,
+            })
+
+        def _name(value):
+            return value[1] if value else None
+
+        return json.dumps({
+            'center_id': center_id,
+            'page': page,
+            'page_size': CENTER_PORTAL_PAGE_SIZE,
+            'case_count': stamp[1],
+            'cases': [{
+                'id': case['id'],
+                'reference': case['name'],
+                'patient': _name(case['partner_id']),
+                'surgery_date': fields.Date.to_string(case['surgery_date']) or None,
+                'stage': _name(case['stage_id']),
+                'surgeon': _name(case['surgeon_employee_id']),
+                'procedure': _name(case['surgery_product_id']),
+                'expected_surgeon_payment': case['expected_surgeon_payment'],
+                'processing_fee_amount': case['processing_fee_amount'],
+                'currency': _name(case['currency_id']),
+                'payment_lines': lines_by_case.get(case['id'], []),
+            } for case in cases],
+        })
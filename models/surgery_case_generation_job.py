@@ -0,0 +1,146 @@
+import logging
+import threading
+from datetime import timedelta
+
+from psycopg2 import errors
+
+from odoo import models, fields, api
+from odoo.tools import str2bool
+
+_logger = logging.getLogger(__name__)
+
+ASYNC_PARAM = 'hamarpea_odoo_surgery_coordination.async_case_generation'
+CONCURRENCY_ERRORS = (errors.SerializationFailure, errors.DeadlockDetected, errors.LockNotAvailable)
+MAX_ATTEMPTS = 5
+
+
+class SurgeryCaseGenerationJob(models.Model):
+    _name = 'surgery.case.generation.job'
+    _description = 'Queued Surgery Case Generation'
+    _order = 'id'
+
+    sale_order_line_id = fields.Many2one(
+        'sale.order.line',
+        string='Sales Order Line',
+        required=True,
+        ondelete='cascade'
+    )
+
+    order_id = fields.Many2one(
+        related='sale_order_line_id.order_id',
+        string='Sales Order',
+        store=True,
+        index=True
+    )
+
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed')
+    ], default='pending', required=True, index=True, string='Status')
+
+    attempts = fields.Integer(string='Attempts')
+
+    last_error = fields.Text(string='Last Error', readonly=True)
+
+    date_done = fields.Datetime(string='Done On', readonly=True)
+
+    _sql_constraints = [
+        ('sale_order_line_uniq', 'unique(sale_order_line_id)',
+         'A sales order line can only be queued once for case generation.'),
+    ]
+
+    @api.model
+    def _is_async_enabled(self):
+        return str2bool(self.env['ir.config_parameter'].sudo().get_param(ASYNC_PARAM, 'False'))
+
+    @api.model
+    def _enqueue(self, lines):
+        """Queue case generation for order lines and wake up the cron.
+
+        Lines already queued are not queued twice; failed jobs are reset to
+        pending so confirming again retries them.
+        """
+        lines = lines.filtered(
+            lambda l: l.product_id.service_tracking == 'surgery_case' and not l.surgery_case_id
+        )
+        if not lines:
+            return self.browse()
+        existing = self.search([('sale_order_line_id', 'in', lines.ids)])
+        existing.filtered(lambda j: j.state == 'failed').write({'state': 'pending', 'attempts': 0})
+        queued_line_ids = set(existing.sale_order_line_id.ids)
+        jobs = existing | self.create([
+            {'sale_order_line_id': line.id}
+            for line in lines if line.id not in queued_line_ids
+        ])
+        self.env.ref('hamarpea_odoo_surgery_coordination.ir_cron_surgery_case_generation')._trigger()
+        return jobs
+
+    def _claim_pending(self, limit):
+        """Lock a batch of pending jobs, skipping those another worker holds"""
+        self.env.cr.execute("""
+            SELECT id FROM surgery_case_generation_job
+             WHERE state = 'pending'
+          ORDER BY id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, [limit])
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+
+    def _run(self):
+        self.sale_order_line_id.sudo()._surgery_case_generation()
+        self.write({'state': 'done', 'date_done': fields.Datetime.now(), 'last_error': False})
+
+    @api.model
+    def _cron_process_jobs(self, batch_size=50):
+        """Generate queued cases in batches, committing after each batch.
+
+        A batch is attempted as a whole; when it fails, its jobs are retried
+        one by one so a single bad line does not hold back the others.
+        Serialization failures roll the transaction back and reschedule the
+        cron, counting an attempt on the jobs involved.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        cron = self.env.ref('hamarpea_odoo_surgery_coordination.ir_cron_surgery_case_generation')
+        while True:
+            jobs = self._claim_pending(batch_size)
+            if not jobs:
+                break
+            try:
+                try:
+                    with self.env.cr.savepoint():
+                        jobs._run()
+                except CONCURRENCY_ERRORS:
+                    raise
+                except Exception:
+                    for job in jobs:
+                        try:
+                            with self.env.cr.savepoint():
+                                job._run()
+                        except CONCURRENCY_ERRORS:
+                            raise
+                        except Exception as e:
+                            _logger.exception("Surgery case generation failed for job %s", job.id)
+                            job.write({
+                                'attempts': job.attempts + 1,
+                                'state': 'failed',
+                                'last_error': str(e),
+                            })
+            except CONCURRENCY_ERRORS as e:
+                if not auto_commit:
+                    raise
+                job_ids = jobs.ids
+                self.env.cr.rollback()
+                self.env.invalidate_all()
+                retry_jobs = self.browse(job_ids).exists()
+                for job in retry_jobs:
+                    job.write({
+                        'attempts': job.attempts + 1,
+                        'state': 'failed' if job.attempts + 1 >= MAX_ATTEMPTS else 'pending',
+                        'last_error': str(e),
+                    })
+                self.env.cr.commit()
+                cron._trigger(fields.Datetime.now() + timedelta(minutes=1))
+                break
+            if auto_commit:
+                self.env.cr.commit()
@@ -0,0 +1,195 @@
+from odoo import models, fields, api, tools
+from odoo.tools.sql import create_index
+
+
+class SurgeryCaseStageHistory(models.Model):
+    _name = 'surgery.case.stage.history'
+    _description = 'Surgery Case Stage History'
+    _order = 'date_in desc, id desc'
+
+    surgery_case_id = fields.Many2one(
+        'surgery.case',
+        string='Surgery Case',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    stage_id = fields.Many2one(
+        'surgery.stage',
+        string='Stage',
+        required=True,
+        ondelete='restrict'
+    )
+
+    # Snapshot of who owned the case while it sat in the stage
+    surgeon_employee_id = fields.Many2one(
+        'hr.employee',
+        string='Surgeon'
+    )
+
+    coordinator_id = fields.Many2one(
+        'res.users',
+        string='Coordinator'
+    )
+
+    date_in = fields.Datetime(
+        string='Entered',
+        required=True
+    )
+
+    date_out = fields.Datetime(
+        string='Left'
+    )
+
+    duration_hours = fields.Float(
+        string='Duration (Hours)',
+        compute='_compute_duration_hours',
+        store=True,
+        digits=(16, 2)
+    )
+
+    def init(self):
+        super().init()
+        # SLA aggregation over completed stays
+        create_index(self.env.cr, 'surgery_case_stage_history_stage_date_out_index',
+                     self._table, ['stage_id', 'date_out'], where='date_out IS NOT NULL')
+        # Finding the open entry of a case when its stage changes
+        create_index(self.env.cr, 'surgery_case_stage_history_open_index',
+                     self._table, ['surgery_case_id'], where='date_out IS NULL')
+
+    @api.depends('date_in', 'date_out')
+    def _compute_duration_hours(self):
+        for entry in self:
+            if entry.date_in and entry.date_out:
+                entry.duration_hours = (entry.date_out - entry.date_in).total_seconds() / 3600
+            else:
+                entry.duration_hours = 0
+
+    @api.model
+    def _record_stage_change(self, cases):
+        """Close the open entries of cases and open one in their current stage.
+
+        Called with the whole batch of cases whose stage changed, so a
+        multi-record write costs one search, one write and one create.
+        Runs as superuser: the ledger is read-only for regular users.
+        """
+        if not cases:
+            return self.browse()
+        now = fields.Datetime.now()
+        History = self.sudo()
+        History.search([
+            ('surgery_case_id', 'in', cases.ids),
+            ('date_out', '=', False),
+        ]).write({'date_out': now})
+        return History.create([{
+            'surgery_case_id': case.id,
+            'stage_id': case.stage_id.id,
+            'surgeon_employee_id': case.surgeon_employee_id.id,
+            'coordinator_id': case.coordinator_id.id,
+            'date_in': now,
+        } for case in cases if case.stage_id]).sudo(False)
+
+    @api.model
+    def _backfill_from_tracking(self):
+        """Rebuild the ledger from stage_id tracking values, once.
+
+        Cases that already have history are left alone, so running it again
+        is harmless. Cases without any tracked stage change get a single
+        open entry starting at their creation.
+        """
+        self.env.flush_all()
+        self.env.cr.execute("""
+            WITH moves AS (
+                SELECT m.res_id AS case_id, m.date AS moved_at, v.id AS tracking_id,
+                       v.old_value_integer AS old_stage_id, v.new_value_integer AS new_stage_id
+                  FROM mail_tracking_value v
+                  JOIN mail_message m ON m.id = v.mail_message_id
+                  JOIN ir_model_fields f ON f.id = v.field_id
+                 WHERE f.model = 'surgery.case' AND f.name = 'stage_id'
+                   AND m.model = 'surgery.case'
+                   AND m.res_id NOT IN (SELECT surgery_case_id FROM surgery_case_stage_history)
+            ),
+            spans AS (
+                -- Stay before the first tracked move, starting at case creation
+                SELECT c.id AS case_id, first_move.old_stage_id AS stage_id,
+                       c.create_date AS date_in, first_move.moved_at AS date_out
+                  FROM surgery_case c
+                  JOIN LATERAL (
+                        SELECT * FROM moves WHERE moves.case_id = c.id
+                      ORDER BY moved_at, tracking_id LIMIT 1
+                  ) first_move ON TRUE
+                UNION ALL
+                SELECT case_id, new_stage_id, moved_at,
+                       LEAD(moved_at) OVER (PARTITION BY case_id ORDER BY moved_at, tracking_id)
+                  FROM moves
+                UNION ALL
+                -- Cases never moved since creation
+                SELECT c.id, c.stage_id, c.create_date, NULL
+                  FROM surgery_case c
+                 WHERE NOT EXISTS (SELECT 1 FROM moves WHERE moves.case_id = c.id)
+                   AND NOT EXISTS (SELECT 1 FROM surgery_case_stage_history h WHERE h.surgery_case_id = c.id)
+            )
+            INSERT INTO surgery_case_stage_history (
+                surgery_case_id, stage_id, surgeon_employee_id, coordinator_id,
+                date_in, date_out, duration_hours,
+                create_uid, create_date, write_uid, write_date
+            )
+            SELECT spans.case_id, spans.stage_id, c.surgeon_employee_id, c.coordinator_id,
+                   spans.date_in, spans.date_out,
+                   COALESCE(EXTRACT(EPOCH FROM spans.date_out - spans.date_in) / 3600, 0),
+                   %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+              FROM spans
+              JOIN surgery_case c ON c.id = spans.case_id
+              JOIN surgery_stage s ON s.id = spans.stage_id
+        """, {'uid': self.env.uid})
+        self.invalidate_model()
+        return self.env.cr.rowcount
+
+
+class SurgeryCaseStageSlaReport(models.Model):
+    _name = 'surgery.case.stage.sla.report'
+    _description = 'Surgery Stage SLA Report'
+    _auto = False
+    _order = 'period desc, stage_id, dimension'
+
+    dimension = fields.Selection([
+        ('stage', 'Stage'),
+        ('surgeon', 'Surgeon'),
+        ('coordinator', 'Coordinator')
+    ], string='Breakdown', readonly=True)
+
+    period = fields.Date(string='Month', readonly=True)
+    stage_id = fields.Many2one('surgery.stage', string='Stage', readonly=True)
+    surgeon_employee_id = fields.Many2one('hr.employee', string='Surgeon', readonly=True)
+    coordinator_id = fields.Many2one('res.users', string='Coordinator', readonly=True)
+    stay_count = fields.Integer(string='Completed Stays', readonly=True)
+    avg_hours = fields.Float(string='Average (Hours)', readonly=True, aggregator=False)
+    median_hours = fields.Float(string='Median (Hours)', readonly=True, aggregator=False)
+    p90_hours = fields.Float(string='P90 (Hours)', readonly=True, aggregator=False)
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(f"""
+            CREATE OR REPLACE VIEW {self._table} AS (
+                SELECT ROW_NUMBER() OVER () AS id,
+                       CASE WHEN GROUPING(h.surgeon_employee_id) = 0 THEN 'surgeon'
+                            WHEN GROUPING(h.coordinator_id) = 0 THEN 'coordinator'
+                            ELSE 'stage' END AS dimension,
+                       DATE_TRUNC('month', h.date_out)::date AS period,
+                       h.stage_id,
+                       h.surgeon_employee_id,
+                       h.coordinator_id,
+                       COUNT(*) AS stay_count,
+                       AVG(h.duration_hours) AS avg_hours,
+                       PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY h.duration_hours) AS median_hours,
+                       PERCENTILE_CONT(0.9) WITHIN GROUP (ORDER BY h.duration_hours) AS p90_hours
+                  FROM surgery_case_stage_history h
+                 WHERE h.date_out IS NOT NULL
+              GROUP BY GROUPING SETS (
+                    (DATE_TRUNC('month', h.date_out), h.stage_id),
+                    (DATE_TRUNC('month', h.date_out), h.stage_id, h.surgeon_employee_id),
+                    (DATE_TRUNC('month', h.date_out), h.stage_id, h.coordinator_id)
+              )
+            )
+        """)
@@ -0,0 +1,226 @@
+from datetime import date, timedelta
+
+from odoo import models, fields, api, tools
+from odoo.exceptions import UserError
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Used when a source has no paid history yet
+DEFAULT_LAG_DAYS = 30
+STATS_MAX_AGE_DAYS = 7
+SOURCE_CODES = {'client': 0, 'insurance': 1, 'surgicenter': 2}
+EPOCH = date(2000, 1, 1)
+
+
+class SurgeryPaymentLagStat(models.Model):
+    _name = 'surgery.payment.lag.stat'
+    _description = 'Surgery Payment Lag Statistics'
+    _order = 'payment_source, partner_id'
+
+    payment_source = fields.Selection([
+        ('client', 'Client'),
+        ('insurance', 'Insurance'),
+        ('surgicenter', 'Surgicenter')
+    ], string='Source', required=True, readonly=True)
+
+    partner_id = fields.Many2one('res.partner', string='Company', readonly=True)
+
+    is_source_default = fields.Boolean(
+        string='Source Default',
+        readonly=True,
+        help='Aggregated over the whole source; used for companies without history of their own'
+    )
+
+    sample_count = fields.Integer(string='Paid Lines', readonly=True)
+    avg_lag_days = fields.Float(string='Average Lag (Days)', digits=(16, 1), readonly=True)
+    median_lag_days = fields.Float(string='Median Lag (Days)', digits=(16, 1), readonly=True)
+    denial_rate = fields.Float(string='Denial Rate', digits=(16, 3), readonly=True)
+
+    @api.model
+    def _recompute_stats(self):
+        """Rebuild lag and denial statistics from paid and settled lines.
+
+        Lag is payment date minus surgery date, per company and per source.
+        Every open projection is marked stale, since its inputs changed.
+        """
+        self.env['surgery.payment.line'].flush_model()
+        self.env['surgery.case'].flush_model(['surgery_date'])
+        self.env.cr.execute("DELETE FROM surgery_payment_lag_stat")
+        self.env.cr.execute("""
+            INSERT INTO surgery_payment_lag_stat (
+                payment_source, partner_id, is_source_default, sample_count,
+                avg_lag_days, median_lag_days, denial_rate,
+                create_uid, create_date, write_uid, write_date
+            )
+            SELECT l.payment_source,
+                   CASE WHEN GROUPING(l.partner_id) = 0 THEN l.partner_id END,
+                   GROUPING(l.partner_id) = 1,
+                   COUNT(*) FILTER (WHERE l.payment_date IS NOT NULL AND l.received_amount > 0),
+                   AVG(l.payment_date - c.surgery_date)
+                       FILTER (WHERE l.payment_date IS NOT NULL AND l.received_amount > 0),
+                   PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY l.payment_date - c.surgery_date)
+                       FILTER (WHERE l.payment_date IS NOT NULL AND l.received_amount > 0),
+                   COALESCE(
+                       COUNT(*) FILTER (WHERE l.claim_status = 'denied')::float
+                       / NULLIF(COUNT(*) FILTER (WHERE l.claim_status IN ('confirmed', 'denied')), 0),
+                   0),
+                   %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+              FROM surgery_payment_line l
+              JOIN surgery_case c ON c.id = l.surgery_case_id
+             WHERE c.surgery_date IS NOT NULL
+          GROUP BY GROUPING SETS ((l.payment_source, l.partner_id), (l.payment_source))
+        """, {'uid': self.env.uid})
+        self.env.cr.execute("UPDATE surgery_payment_line SET projection_stale = TRUE WHERE NOT projection_stale")
+        self.invalidate_model()
+        self.env['surgery.payment.line'].invalidate_model(['projection_stale'])
+
+    def _get_lag_tables(self):
+        """Lag and denial rate lookup tables: per (source, company) and per source"""
+        stats = self.search([])
+        default_lag = np.full(len(SOURCE_CODES), DEFAULT_LAG_DAYS, dtype=np.float64)
+        default_denial = np.zeros(len(SOURCE_CODES))
+        keys, lags, denials = [], [], []
+        for stat in stats:
+            code = SOURCE_CODES[stat.payment_source]
+            lag = stat.median_lag_days if stat.sample_count else DEFAULT_LAG_DAYS
+            if stat.is_source_default:
+                default_lag[code] = lag
+                default_denial[code] = stat.denial_rate
+            elif stat.partner_id:
+                keys.append(code * 2 ** 32 + stat.partner_id.id)
+                lags.append(lag)
+                denials.append(stat.denial_rate)
+        order = np.argsort(np.array(keys, dtype=np.int64))
+        return (
+            np.array(keys, dtype=np.int64)[order],
+            np.array(lags, dtype=np.float64)[order],
+            np.array(denials, dtype=np.float64)[order],
+            default_lag,
+            default_denial,
+        )
+
+    @api.model
+    def _refresh_projections(self, full=False):
+        """Project the stale payment lines (or all of them) in one pass.
+
+        Open lines are read with one query, projected with array operations
+        against the lag tables and written back with one UPDATE.
+        """
+        if np is None:
+            raise UserError("The cash projection requires the numpy Python package.")
+        last_stats = self.search([], order='create_date desc', limit=1)
+        if not last_stats or last_stats.create_date < fields.Datetime.now() - timedelta(days=STATS_MAX_AGE_DAYS):
+            self._recompute_stats()
+            full = True
+
+        PaymentLine = self.env['surgery.payment.line']
+        PaymentLine.flush_model()
+        self.env['surgery.case'].flush_model(['surgery_date'])
+        self.env.cr.execute(f"""
+            SELECT l.id,
+                   CASE l.payment_source WHEN 'client' THEN 0 WHEN 'insurance' THEN 1 ELSE 2 END,
+                   COALESCE(l.partner_id, 0),
+                   COALESCE(c.surgery_date, CURRENT_DATE) - %(epoch)s,
+                   CASE WHEN l.status = 'paid' OR l.claim_status = 'denied' THEN 0
+                        ELSE GREATEST(COALESCE(l.expected_amount, 0) - COALESCE(l.received_amount, 0), 0) END,
+                   (l.payment_source = 'insurance' AND l.claim_status = 'pending')::int
+              FROM surgery_payment_line l
+              JOIN surgery_case c ON c.id = l.surgery_case_id
+             {'' if full else 'WHERE l.projection_stale'}
+        """, {'epoch': EPOCH})
+        rows = self.env.cr.fetchall()
+        if not rows:
+            return 0
+        data = np.array(rows, dtype=np.float64)
+        line_ids = data[:, 0].astype(np.int64)
+        source = data[:, 1].astype(np.int64)
+        partner = data[:, 2].astype(np.int64)
+        base_day = data[:, 3]
+        remaining = data[:, 4]
+        pending_claim = data[:, 5].astype(bool)
+
+        keys, key_lags, key_denials, default_lag, default_denial = self._get_lag_tables()
+        lag = default_lag[source]
+        denial = default_denial[source]
+        if len(keys):
+            line_keys = source * 2 ** 32 + partner
+            position = np.clip(np.searchsorted(keys, line_keys), 0, len(keys) - 1)
+            found = keys[position] == line_keys
+            lag = np.where(found, key_lags[position], lag)
+            denial = np.where(found, key_denials[position], denial)
+
+        projected_day = base_day + np.rint(lag)
+        projected_amount = np.where(pending_claim, remaining * (1 - denial), remaining)
+        projected_dates = [EPOCH + timedelta(days=int(day)) for day in projected_day]
+
+        self.env.cr.execute("""
+            UPDATE surgery_payment_line l
+               SET projected_date = CASE WHEN v.amount > 0 THEN v.projected_date END,
+                   projected_amount = v.amount,
+                   projection_stale = FALSE
+              FROM unnest(%s::int[], %s::date[], %s::numeric[]) AS v(id, projected_date, amount)
+             WHERE l.id = v.id
+        """, [line_ids.tolist(), projected_dates, np.round(projected_amount, 2).tolist()])
+        PaymentLine.invalidate_model(['projected_date', 'projected_amount', 'projection_stale'])
+        return len(rows)
+
+    @api.model
+    def _cron_refresh_projections(self):
+        self._refresh_projections()
+
+    @api.model
+    def action_refresh_projection(self):
+        count = self._refresh_projections()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Cash Projection',
+                'message': f"{count} payment line(s) re-projected.",
+                'type': 'success',
+                'sticky': False,
+            },
+        }
+
+
+class SurgeryCashProjectionReport(models.Model):
+    _name = 'surgery.cash.projection.report'
+    _description = 'Surgery Weekly Cash Inflow Projection'
+    _auto = False
+    _order = 'week, payment_source, partner_id'
+
+    week = fields.Date(string='Week', readonly=True)
+
+    payment_source = fields.Selection([
+        ('client', 'Client'),
+        ('insurance', 'Insurance'),
+        ('surgicenter', 'Surgicenter')
+    ], string='Source', readonly=True)
+
+    partner_id = fields.Many2one('res.partner', string='Company', readonly=True)
+    line_count = fields.Integer(string='Lines', readonly=True)
+    projected_amount = fields.Monetary(string='Projected Inflow', readonly=True)
+    currency_id = fields.Many2one('res.currency', string='Currency', readonly=True)
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        # Overdue projections are expected this week rather than in the past
+        self.env.cr.execute(f"""
+            CREATE OR REPLACE VIEW {self._table} AS (
+                SELECT ROW_NUMBER() OVER () AS id,
+                       DATE_TRUNC('week', GREATEST(l.projected_date, CURRENT_DATE))::date AS week,
+                       l.payment_source,
+                       l.partner_id,
+                       l.currency_id,
+                       COUNT(*) AS line_count,
+                       SUM(l.projected_amount) AS projected_amount
+                  FROM surgery_payment_line l
+                  JOIN surgery_case c ON c.id = l.surgery_case_id
+                 WHERE c.active
+                   AND l.projected_amount > 0
+              GROUP BY 2, l.payment_source, l.partner_id, l.currency_id
+            )
+        """)
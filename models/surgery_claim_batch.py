@@ -0,0 +1,357 @@
+import csv
+import hashlib
+import io
+import tempfile
+import threading
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+CLAIM_CHUNK_SIZE = 1000
+
+
+class SurgeryClaimLayout(models.Model):
+    _name = 'surgery.claim.layout'
+    _description = 'Insurance Claim File Layout'
+    _order = 'sequence, id'
+
+    name = fields.Char(string='Layout', required=True)
+    sequence = fields.Integer(default=10)
+
+    file_format = fields.Selection([
+        ('csv', 'CSV'),
+        ('fixed', 'Fixed Width')
+    ], string='Format', required=True, default='csv')
+
+    delimiter = fields.Char(
+        string='Delimiter',
+        size=1,
+        default=',',
+        help='Column separator for CSV files'
+    )
+
+    include_header = fields.Boolean(
+        string='Header Row',
+        default=True
+    )
+
+    is_default = fields.Boolean(
+        string='Default Layout',
+        help='Used for insurers without a claim layout of their own'
+    )
+
+    column_ids = fields.One2many(
+        'surgery.claim.layout.column',
+        'layout_id',
+        string='Columns',
+        copy=True
+    )
+
+    @api.model
+    def _get_for_insurer(self, insurer):
+        layout = insurer.claim_layout_id or self.search([('is_default', '=', True)], limit=1)
+        if not layout:
+            raise UserError(f"No claim file layout for {insurer.name} and no default layout configured.")
+        return layout
+
+    def _format_row(self, values):
+        """Render one row of already-resolved string values"""
+        if self.file_format == 'csv':
+            buffer = io.StringIO()
+            csv.writer(buffer, delimiter=self.delimiter or ',', lineterminator='\n').writerow(values)
+            return buffer.getvalue()
+        cells = []
+        for column, value in zip(self.column_ids, values):
+            value = value[:column.width]
+            if column.align == 'right':
+                cells.append(value.rjust(column.width, column.pad_char or ' '))
+            else:
+                cells.append(value.ljust(column.width, column.pad_char or ' '))
+        return ''.join(cells) + '\n'
+
+    def _render_header(self):
+        return self._format_row([column.name for column in self.column_ids])
+
+    def _render_case(self, case, extra_values):
+        return self._format_row([column._get_value(case, extra_values) for column in self.column_ids])
+
+
+class SurgeryClaimLayoutColumn(models.Model):
+    _name = 'surgery.claim.layout.column'
+    _description = 'Insurance Claim File Column'
+    _order = 'sequence, id'
+
+    layout_id = fields.Many2one(
+        'surgery.claim.layout',
+        string='Layout',
+        required=True,
+        ondelete='cascade'
+    )
+
+    sequence = fields.Integer(default=10)
+
+    name = fields.Char(string='Header', required=True)
+
+    source = fields.Selection([
+        ('field', 'Case Field'),
+        ('claim_amount', 'Claimed Amount'),
+        ('batch', 'Batch Reference'),
+        ('constant', 'Constant')
+    ], string='Source', required=True, default='field')
+
+    field_path = fields.Char(
+        string='Field Path',
+        help='Dotted path from the surgery case, e.g. partner_id.name or surgery_date'
+    )
+
+    constant = fields.Char(string='Value')
+
+    width = fields.Integer(
+        string='Width',
+        default=20,
+        help='Column width for fixed-width files'
+    )
+
+    align = fields.Selection([
+        ('left', 'Left'),
+        ('right', 'Right')
+    ], string='Align', default='left')
+
+    pad_char = fields.Char(string='Padding', size=1, default=' ')
+
+    def _get_value(self, case, extra_values):
+        if self.source == 'constant':
+            return self.constant or ''
+        if self.source in extra_values:
+            value = extra_values[self.source]
+        else:
+            value = case
+            for name in (self.field_path or '').split('.'):
+                if not name:
+                    continue
+                value = value[name] if value else False
+        if isinstance(value, models.BaseModel):
+            return value.display_name or ''
+        if isinstance(value, float):
+            return f"{value:.2f}"
+        if value is False or value is None:
+            return ''
+        return str(value)
+
+
+class SurgeryClaimBatch(models.Model):
+    _name = 'surgery.claim.batch'
+    _description = 'Insurance Claim Submission Run'
+    _order = 'id desc'
+
+    name = fields.Char(string='Reference', readonly=True, copy=False)
+
+    date = fields.Date(
+        string='Date',
+        required=True,
+        default=fields.Date.context_today
+    )
+
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('partial', 'Partially Submitted'),
+        ('done', 'Submitted')
+    ], default='draft', string='Status', readonly=True,
+        help='Partially Submitted: some insurer files were generated before the run stopped; submit again to finish')
+
+    insurance_company_ids = fields.Many2many(
+        'res.partner',
+        string='Insurers',
+        domain=[('account_type', 'in', ['private_insurance', 'kupat_holim'])],
+        help='Leave empty to submit claims of every insurer'
+    )
+
+    case_count = fields.Integer(string='Cases', readonly=True)
+
+    file_ids = fields.One2many(
+        'surgery.claim.batch.file',
+        'batch_id',
+        string='Claim Files',
+        readonly=True
+    )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        batches = super().create(vals_list)
+        for batch in batches.filtered(lambda b: not b.name):
+            batch.name = f"CLM{batch.date:%Y%m%d}-{batch.id}"
+        return batches
+
+    def _get_ready_domain(self):
+        domain = [
+            ('insurance_company_id', '!=', False),
+            ('insurance_claim_status', '=', 'not_submitted'),
+            ('stage_id.is_closed', '=', False),
+        ]
+        if self.insurance_company_ids:
+            domain.append(('insurance_company_id', 'in', self.insurance_company_ids.ids))
+        return domain
+
+    def _assign_claim_references(self, case_ids):
+        """Give cases without a claim number one derived from the batch, copy
+        it to their insurance payment lines missing a reference, and put
+        those lines back in the pending claim state."""
+        cases = self.env['surgery.case'].browse(case_ids)
+        for case in cases.filtered(lambda c: not c.insurance_claim_number):
+            case.insurance_claim_number = f"{self.name}/{case.name}"
+        lines = self.env['surgery.payment.line'].search([
+            ('surgery_case_id', 'in', case_ids),
+            ('payment_source', '=', 'insurance'),
+        ])
+        for case, case_lines in lines.grouped('surgery_case_id').items():
+            case_lines.filtered(lambda l: not l.reference).write({'reference': case.insurance_claim_number})
+        lines.filtered(lambda l: l.claim_status not in ('pending', 'confirmed')).write({'claim_status': 'pending'})
+
+    def _write_insurer_file(self, insurer, case_ids):
+        """Render the claim file of one insurer chunk by chunk.
+
+        Chunks go to a temporary file that is then copied to the filestore,
+        so the whole file is never held in memory.
+        """
+        layout = self.env['surgery.claim.layout']._get_for_insurer(insurer)
+        Case = self.env['surgery.case']
+        sha = hashlib.sha1()
+        size = 0
+        total = 0.0
+        with tempfile.TemporaryFile() as tmp:
+            def _write(text):
+                nonlocal size
+                data = text.encode('utf-8')
+                sha.update(data)
+                size += len(data)
+                tmp.write(data)
+
+            if layout.include_header:
+                _write(layout._render_header())
+            for start in range(0, len(case_ids), CLAIM_CHUNK_SIZE):
+                cases = Case.browse(case_ids[start:start + CLAIM_CHUNK_SIZE])
+                amounts = dict(self.env['surgery.payment.line']._read_group(
+                    [('surgery_case_id', 'in', cases.ids), ('payment_source', '=', 'insurance')],
+                    ['surgery_case_id'], ['expected_amount:sum'],
+                ))
+                for case in cases:
+                    amount = amounts.get(case, 0.0)
+                    total += amount
+                    _write(layout._render_case(case, {'claim_amount': amount, 'batch': self.name}))
+                self.env.invalidate_all()
+
+            tmp.seek(0)
+            extension = 'csv' if layout.file_format == 'csv' else 'txt'
+            attachment = self._create_claim_attachment(
+                tmp, f"{self.name}_{insurer.name}.{extension}",
+                'text/csv' if extension == 'csv' else 'text/plain',
+                sha.hexdigest(), size,
+            )
+        return self.env['surgery.claim.batch.file'].create({
+            'batch_id': self.id,
+            'insurance_company_id': insurer.id,
+            'case_count': len(case_ids),
+            'total_amount': total,
+            'attachment_id': attachment.id,
+        })
+
+    def _create_claim_attachment(self, stream, name, mimetype, checksum, size):
+        """Attachment of the batch with the content of a rendered stream"""
+        Attachment = self.env['ir.attachment'].sudo()
+        vals = {'name': name, 'mimetype': mimetype, 'res_model': self._name, 'res_id': self.id}
+        if Attachment._storage() != 'file':
+            return Attachment.create({**vals, 'raw': stream.read()})
+        fname = self.env['surgery.lab.document']._write_filestore(stream, checksum)
+        attachment = Attachment.create(vals)
+        self.env.cr.execute("""
+            UPDATE ir_attachment
+               SET store_fname = %s, checksum = %s, file_size = %s, mimetype = %s, db_datas = NULL
+             WHERE id = %s
+        """, [fname, checksum, size, mimetype, attachment.id])
+        attachment.invalidate_recordset()
+        return attachment
+
+    def action_submit(self):
+        """Write one claim file per insurer and mark all included cases submitted.
+
+        Cases are grouped by insurer with one query, files are rendered in
+        chunks, and the status update is a single write per insurer with
+        tracking disabled; the batch keeps the audit trail instead.
+        """
+        self.ensure_one()
+        if self.state == 'done':
+            raise UserError("This claim batch has already been submitted.")
+        Case = self.env['surgery.case']
+        groups = Case._read_group(self._get_ready_domain(), ['insurance_company_id'], ['id:array_agg'])
+        if not groups:
+            raise UserError("No cases are ready for claim submission.")
+
+        auto_commit = self.env.context.get('surgery_claim_auto_commit') and \
+            not getattr(threading.current_thread(), 'testing', False)
+        for insurer, case_ids in groups:
+            case_ids = sorted(case_ids)
+            self._assign_claim_references(case_ids)
+            self._write_insurer_file(insurer, case_ids)
+            Case.browse(case_ids).with_context(
+                tracking_disable=True, mail_notrack=True
+            ).write({'insurance_claim_status': 'submitted'})
+            self.case_count += len(case_ids)
+            # A run stopped after this point resumes with the remaining insurers
+            self.state = 'partial'
+            if auto_commit:
+                self.env.cr.commit()
+
+        self.state = 'done'
+        return True
+
+    @api.model
+    def _cron_submit_claims(self):
+        """Weekly claim run over every insurer"""
+        if not self.env['surgery.case'].search_count(self.browse()._get_ready_domain(), limit=1):
+            return
+        batch = self.search([('state', '=', 'partial'), ('insurance_company_ids', '=', False)], limit=1)
+        (batch or self.create({})).with_context(surgery_claim_auto_commit=True).action_submit()
+
+
+class SurgeryClaimBatchFile(models.Model):
+    _name = 'surgery.claim.batch.file'
+    _description = 'Insurance Claim File'
+    _order = 'batch_id desc, insurance_company_id'
+
+    batch_id = fields.Many2one(
+        'surgery.claim.batch',
+        string='Claim Batch',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    insurance_company_id = fields.Many2one(
+        'res.partner',
+        string='Insurer',
+        required=True
+    )
+
+    case_count = fields.Integer(string='Cases')
+
+    total_amount = fields.Monetary(string='Claimed Amount')
+
+    currency_id = fields.Many2one(
+        'res.currency',
+        string='Currency',
+        default=lambda self: self.env.company.currency_id
+    )
+
+    attachment_id = fields.Many2one(
+        'ir.attachment',
+        string='File',
+        ondelete='set null'
+    )
+
+    def action_download(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/web/content/{self.attachment_id.id}?download=true',
+            'target': 'self',
+        }
@@ -0,0 +1,306 @@
+import json
+import logging
+import threading
+from datetime import timedelta
+
+import requests
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+OUTBOX_RETENTION_PARAM = 'hamarpea_odoo_surgery_coordination.event_retention_days'
+SINK_MAX_BACKOFF_MINUTES = 60
+
+
+class SurgeryEventOutboxMixin(models.AbstractModel):
+    """Write an outbox event when watched fields of a record change.
+
+    Old values are read from the database the first time a record is
+    written in a transaction (including recomputed stored fields, which go
+    through _write); just before commit they are compared with the final
+    values, so a transaction yields at most one event per record and
+    nothing at all when it is rolled back.
+    """
+    _name = 'surgery.event.outbox.mixin'
+    _description = 'Surgery Event Outbox Mixin'
+
+    # Columns whose changes produce events
+    _outbox_fields = ()
+    # Columns sent along with every event of the model
+    _outbox_context_fields = ()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        snapshots = self._outbox_snapshots()
+        for record_id in records.ids:
+            snapshots[record_id] = None
+        return records
+
+    def _write(self, vals):
+        if self._outbox_fields and not set(self._outbox_fields).isdisjoint(vals):
+            self._outbox_capture()
+        return super()._write(vals)
+
+    def unlink(self):
+        self._outbox_capture()
+        return super().unlink()
+
+    def _outbox_snapshots(self):
+        """Old values of the records touched in the current transaction"""
+        key = f'surgery.outbox.{self._name}'
+        data = self.env.cr.precommit.data
+        if key not in data:
+            data[key] = {}
+            self.env.cr.precommit.add(self.browse()._outbox_flush)
+        return data[key]
+
+    def _outbox_read(self):
+        columns = ['id', *self._outbox_context_fields, *self._outbox_fields]
+        self.env.cr.execute(
+            f"SELECT {', '.join(columns)} FROM {self._table} WHERE id IN %s",
+            [tuple(self.ids)],
+        )
+        return {row[0]: dict(zip(columns[1:], row[1:])) for row in self.env.cr.fetchall()}
+
+    def _outbox_capture(self):
+        snapshots = self._outbox_snapshots()
+        new_ids = [record_id for record_id in self.ids if record_id not in snapshots]
+        if new_ids:
+            snapshots.update(self.browse(new_ids)._outbox_read())
+
+    def _outbox_flush(self):
+        snapshots = self.env.cr.precommit.data.get(f'surgery.outbox.{self._name}')
+        if not snapshots:
+            return
+        current = self.browse(list(snapshots))._outbox_read()
+        events = []
+        for record_id, old in sorted(snapshots.items()):
+            new = current.get(record_id)
+            if old is None and new is None:
+                continue
+            if old is None:
+                event_type = 'created'
+                changes = {name: [None, new[name]] for name in self._outbox_fields}
+            elif new is None:
+                event_type = 'deleted'
+                changes = {name: [old[name], None] for name in self._outbox_fields}
+            else:
+                event_type = 'updated'
+                changes = {
+                    name: [old[name], new[name]]
+                    for name in self._outbox_fields if old[name] != new[name]
+                }
+                if not changes:
+                    continue
+            values = new or old
+            events.append((record_id, event_type, {
+                'changes': changes,
+                **{name: values[name] for name in self._outbox_context_fields},
+            }))
+        snapshots.clear()
+        self.env['surgery.event.outbox']._append(self._name, events)
+
+
+class SurgeryEventOutbox(models.Model):
+    _name = 'surgery.event.outbox'
+    _description = 'Surgery Event Outbox'
+    _order = 'id'
+
+    model = fields.Char(string='Model', required=True, readonly=True)
+    res_id = fields.Integer(string='Record ID', required=True, readonly=True)
+
+    event_type = fields.Selection([
+        ('created', 'Created'),
+        ('updated', 'Updated'),
+        ('deleted', 'Deleted')
+    ], string='Event', required=True, readonly=True)
+
+    payload = fields.Text(string='Payload', readonly=True)
+
+    @api.model
+    def _append(self, model, events):
+        """Insert events of one model in a single statement.
+
+        The advisory lock is held until commit, so events are committed in
+        id order and consumers reading past an offset never skip one.
+        """
+        if not events:
+            return
+        cr = self.env.cr
+        cr.execute("SELECT pg_advisory_xact_lock(hashtext('surgery_event_outbox'))")
+        values = [
+            (model, res_id, event_type, json.dumps(payload, default=str), self.env.uid, self.env.uid)
+            for res_id, event_type, payload in events
+        ]
+        placeholders = ', '.join(
+            ["(%s, %s, %s, %s, %s, NOW() AT TIME ZONE 'UTC', %s, NOW() AT TIME ZONE 'UTC')"] * len(values)
+        )
+        cr.execute(f"""
+            INSERT INTO surgery_event_outbox
+                   (model, res_id, event_type, payload, create_uid, create_date, write_uid, write_date)
+            VALUES {placeholders}
+        """, [value for row in values for value in row])
+
+    @api.model
+    def _read_after(self, after_id, limit):
+        """Events past an offset, as plain dicts, oldest first"""
+        self.env.cr.execute("""
+            SELECT id, model, res_id, event_type, payload, create_date
+              FROM surgery_event_outbox
+             WHERE id > %s
+          ORDER BY id
+             LIMIT %s
+        """, [after_id, limit])
+        return [{
+            'id': event_id,
+            'model': model,
+            'res_id': res_id,
+            'event': event_type,
+            'data': json.loads(payload or '{}'),
+            'date': fields.Datetime.to_string(create_date),
+        } for event_id, model, res_id, event_type, payload, create_date in self.env.cr.fetchall()]
+
+    @api.autovacuum
+    def _gc_events(self):
+        """Drop events past retention that every active sink has delivered"""
+        days = int(self.env['ir.config_parameter'].sudo().get_param(OUTBOX_RETENTION_PARAM, 30))
+        self.env.cr.execute("""
+            DELETE FROM surgery_event_outbox
+             WHERE create_date < %s
+               AND id <= COALESCE((SELECT MIN(last_event_id) FROM surgery_event_sink WHERE active), id)
+        """, [fields.Datetime.now() - timedelta(days=days)])
+
+
+class SurgeryEventSink(models.Model):
+    _name = 'surgery.event.sink'
+    _description = 'Surgery Event Sink'
+    _order = 'name'
+
+    name = fields.Char(string='Name', required=True)
+    active = fields.Boolean(default=True)
+
+    sink_type = fields.Selection([
+        ('http', 'HTTP Endpoint'),
+        ('file', 'File'),
+        ('queue', 'Bus Channel')
+    ], string='Type', required=True, default='http')
+
+    url = fields.Char(string='URL', help='Events are POSTed as a JSON array')
+
+    auth_header = fields.Char(
+        string='Authorization Header',
+        groups='base.group_system'
+    )
+
+    file_path = fields.Char(string='File Path', help='Events are appended as JSON lines')
+
+    channel = fields.Char(string='Channel', help='Bus channel the events are sent on')
+
+    batch_size = fields.Integer(string='Batch Size', default=500)
+
+    last_event_id = fields.Integer(
+        string='Delivered Up To',
+        help='Offset of the last delivered event; lower it to replay events'
+    )
+
+    failure_count = fields.Integer(string='Consecutive Failures', readonly=True)
+    next_attempt = fields.Datetime(string='Next Attempt', readonly=True)
+    last_error = fields.Text(string='Last Error', readonly=True)
+
+    def _deliver(self, events):
+        self.ensure_one()
+        if self.sink_type == 'http':
+            headers = {'Content-Type': 'application/json'}
+            if self.auth_header:
+                headers['Authorization'] = self.auth_header
+            response = requests.post(self.url, data=json.dumps(events), headers=headers, timeout=30)
+            response.raise_for_status()
+        elif self.sink_type == 'file':
+            with open(self.file_path, 'a', encoding='utf-8') as file:
+                file.writelines(json.dumps(event) + '\n' for event in events)
+        else:
+            self.env['bus.bus']._sendone(self.channel, 'surgery_events', events)
+
+    def _claim(self):
+        """Lock due sinks, skipping those another dispatcher is delivering to.
+
+        Session-level advisory locks, unlike row locks, survive the commits
+        made between batches; _release() must be called once done.
+        """
+        self.env.cr.execute("""
+            SELECT id FROM surgery_event_sink
+             WHERE active
+               AND (next_attempt IS NULL OR next_attempt <= %s)
+          ORDER BY id
+        """, [fields.Datetime.now()])
+        sink_ids = []
+        for (sink_id,) in self.env.cr.fetchall():
+            self.env.cr.execute(
+                "SELECT pg_try_advisory_lock(hashtext('surgery_event_sink'), %s)", [sink_id]
+            )
+            if self.env.cr.fetchone()[0]:
+                sink_ids.append(sink_id)
+        return self.browse(sink_ids)
+
+    def _release(self):
+        for sink_id in self.ids:
+            self.env.cr.execute(
+                "SELECT pg_advisory_unlock(hashtext('surgery_event_sink'), %s)", [sink_id]
+            )
+
+    @api.model
+    def _cron_dispatch(self, max_batches=20):
+        """Deliver pending events to every due sink in ordered batches.
+
+        The offset only moves once a batch is delivered, so delivery is
+        at-least-once and in order. A failing sink is retried with an
+        exponential backoff while the others carry on.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        Outbox = self.env['surgery.event.outbox']
+        sinks = self.sudo()._claim()
+        try:
+            if auto_commit:
+                # Fresh snapshot: offsets another dispatcher committed before we
+                # got the locks must be visible
+                self.env.cr.commit()
+                self.env.invalidate_all()
+            for sink in sinks:
+                for _batch in range(max_batches):
+                    events = Outbox._read_after(sink.last_event_id, sink.batch_size or 500)
+                    if not events:
+                        break
+                    try:
+                        sink._deliver(events)
+                    except Exception as e:
+                        _logger.warning("Delivery to event sink %s failed: %s", sink.name, e)
+                        sink.write({
+                            'failure_count': sink.failure_count + 1,
+                            'next_attempt': fields.Datetime.now() + timedelta(
+                                minutes=min(2 ** sink.failure_count, SINK_MAX_BACKOFF_MINUTES)
+                            ),
+                            'last_error': str(e),
+                        })
+                        break
+                    sink.write({
+                        'last_event_id': events[-1]['id'],
+                        'failure_count': 0,
+                        'next_attempt': False,
+                        'last_error': False,
+                    })
+                    if auto_commit:
+                        self.env.cr.commit()
+                if auto_commit:
+                    self.env.cr.commit()
+        except Exception:
+            if auto_commit:
+                # Leave the failed transaction so the locks can be released
+                self.env.cr.rollback()
+            raise
+        finally:
+            sinks._release()
+
+    def action_reset_offset(self):
+        self.write({'last_event_id': 0, 'failure_count': 0, 'next_attempt': False, 'last_error': False})
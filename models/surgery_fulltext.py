@@ -0,0 +1,19 @@
+from odoo.tools.sql import column_exists, create_index
+
+# Patients' records mix Hebrew and English, so no language-specific stemming
+FTS_CONFIG = 'simple'
+
+
+def init_tsvector_column(cr, table, column, source):
+    """Add a generated tsvector column over a text column, with a GIN index.
+
+    PostgreSQL keeps the column current on every insert and update, so the
+    ORM never has to know about it.
+    """
+    if not column_exists(cr, table, column):
+        cr.execute(f"""
+            ALTER TABLE {table}
+             ADD COLUMN {column} tsvector
+                 GENERATED ALWAYS AS (to_tsvector('{FTS_CONFIG}', COALESCE({source}, ''))) STORED
+        """)
+    create_index(cr, f'{table}_{column}_index', table, [column], method='gin')
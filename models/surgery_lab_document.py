@@ -0,0 +1,324 @@
+import hashlib
+import io
+import logging
+import os
+import threading
+
+from psycopg2 import errors
+
+from odoo import models, fields, api
+from odoo.exceptions import ConcurrencyError, UserError
+from odoo.tools.image import image_process
+from odoo.tools.mimetypes import guess_mimetype
+
+try:
+    from odoo.tools.pdf import PdfFileReader
+except ImportError:
+    PdfFileReader = None
+
+_logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_SIZE = 1024 * 1024
+TEXT_PREVIEW_CHARS = 2000
+LAB_MIMETYPES = ('application/pdf', 'image/')
+
+
+class SurgeryLabDocument(models.Model):
+    _name = 'surgery.lab.document'
+    _description = 'Lab Document'
+    _order = 'id desc'
+
+    name = fields.Char(string='File Name', required=True)
+
+    checksum = fields.Char(
+        string='Checksum',
+        required=True,
+        readonly=True,
+        help='SHA-1 of the content; the same file is stored once whatever the number of uploads'
+    )
+
+    file_size = fields.Integer(string='Size', readonly=True)
+    mimetype = fields.Char(string='Type', readonly=True)
+
+    attachment_id = fields.Many2one(
+        'ir.attachment',
+        string='File',
+        readonly=True,
+        ondelete='restrict'
+    )
+
+    link_ids = fields.One2many(
+        'surgery.lab.document.link',
+        'document_id',
+        string='Checklist Items'
+    )
+
+    link_count = fields.Integer(
+        compute='_compute_link_count',
+        string='Linked Items'
+    )
+
+    preview_state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed')
+    ], default='pending', required=True, index=True, string='Preview')
+
+    thumbnail = fields.Image(
+        string='Thumbnail',
+        max_width=256,
+        max_height=256,
+        attachment=True,
+        readonly=True
+    )
+
+    text_preview = fields.Text(string='Text Preview', readonly=True)
+
+    _sql_constraints = [
+        ('checksum_uniq', 'unique(checksum)', 'This file is already stored as a lab document.'),
+    ]
+
+    @api.depends('link_ids')
+    def _compute_link_count(self):
+        counts = dict(self.env['surgery.lab.document.link']._read_group(
+            [('document_id', 'in', self.ids)], ['document_id'], ['__count'],
+        ))
+        for document in self:
+            document.link_count = counts.get(document, 0)
+
+    # ==================== STORAGE ====================
+
+    @api.model
+    def _get_or_create_from_stream(self, stream, filename, mimetype=None):
+        """Store an uploaded file once, reading it chunk by chunk.
+
+        The stream is hashed first; a known checksum returns the existing
+        document without touching the content again. New content is copied
+        straight into the filestore, never held in memory as a whole.
+        Returns (document, created).
+        """
+        sha = hashlib.sha1()
+        head = b''
+        size = 0
+        for chunk in iter(lambda: stream.read(STREAM_CHUNK_SIZE), b''):
+            if not head:
+                head = chunk[:1024]
+            sha.update(chunk)
+            size += len(chunk)
+        if not size:
+            raise UserError(f"{filename} is empty.")
+        checksum = sha.hexdigest()
+        mimetype = mimetype if mimetype and mimetype != 'application/octet-stream' else guess_mimetype(head)
+        document, created = self._get_or_create({
+            'name': filename,
+            'checksum': checksum,
+            'file_size': size,
+            'mimetype': mimetype,
+        })
+        if not created:
+            return document, False
+
+        stream.seek(0)
+        Attachment = self.env['ir.attachment'].sudo()
+        if Attachment._storage() != 'file':
+            attachment = Attachment.create({
+                'name': filename,
+                'raw': stream.read(),
+                'mimetype': mimetype,
+                'res_model': self._name,
+                'res_id': document.id,
+            })
+        else:
+            fname = self._write_filestore(stream, checksum)
+            attachment = self._create_file_attachment(document, fname, checksum, size, mimetype)
+        document.attachment_id = attachment
+        self.env.ref('hamarpea_odoo_surgery_coordination.ir_cron_surgery_lab_document_preview')._trigger()
+        return document, True
+
+    @api.model
+    def _get_or_create(self, vals):
+        """Document for a checksum; a concurrent upload of the same file wins.
+
+        The winner's row is not visible from this transaction's snapshot, so
+        the loser raises a ConcurrencyError: the request is retried and then
+        finds the document.
+        """
+        document = self.search([('checksum', '=', vals['checksum'])], limit=1)
+        if document:
+            return document, False
+        try:
+            with self.env.cr.savepoint(flush=False):
+                document = self.create(vals)
+                document.flush_recordset()
+        except errors.UniqueViolation as e:
+            raise ConcurrencyError(f"{vals.get('name')} is being uploaded concurrently; retrying.") from e
+        return document, True
+
+    @api.model
+    def _write_filestore(self, stream, checksum):
+        """Copy a stream to its content-addressed filestore path"""
+        Attachment = self.env['ir.attachment']
+        fname = f'{checksum[:2]}/{checksum}'
+        full_path = Attachment._full_path(fname)
+        if not os.path.isfile(full_path):
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            tmp_path = f'{full_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as target:
+                for chunk in iter(lambda: stream.read(STREAM_CHUNK_SIZE), b''):
+                    target.write(chunk)
+            os.replace(tmp_path, full_path)
+        # Collected by the filestore GC if the transaction rolls back
+        Attachment._mark_for_gc(fname)
+        return fname
+
+    def _create_file_attachment(self, document, fname, checksum, size, mimetype):
+        """Attachment on an already stored file; the content is never loaded"""
+        attachment = self.env['ir.attachment'].sudo().create({
+            'name': document.name,
+            'mimetype': mimetype,
+            'res_model': self._name,
+            'res_id': document.id,
+        })
+        self.env.cr.execute("""
+            UPDATE ir_attachment
+               SET store_fname = %s, checksum = %s, file_size = %s, mimetype = %s, db_datas = NULL
+             WHERE id = %s
+        """, [fname, checksum, size, mimetype, attachment.id])
+        attachment.invalidate_recordset()
+        return attachment
+
+    @api.model
+    def _get_or_create_from_attachment(self, attachment):
+        """Lab document sharing the content of an existing attachment"""
+        attachment = attachment.sudo()
+        document, created = self._get_or_create({
+            'name': attachment.name,
+            'checksum': attachment.checksum,
+            'file_size': attachment.file_size,
+            'mimetype': attachment.mimetype,
+        })
+        if not created:
+            return document, False
+        if attachment.store_fname:
+            document.attachment_id = self._create_file_attachment(
+                document, attachment.store_fname, attachment.checksum, attachment.file_size, attachment.mimetype
+            )
+        else:
+            document.attachment_id = attachment.copy({'res_model': self._name, 'res_id': document.id})
+        self.env.ref('hamarpea_odoo_surgery_coordination.ir_cron_surgery_lab_document_preview')._trigger()
+        return document, True
+
+    def _link_to_item(self, item, filename=None, post=True):
+        """Link the document to a checklist item, once"""
+        self.ensure_one()
+        link = self.env['surgery.lab.document.link'].search([
+            ('document_id', '=', self.id),
+            ('medical_item_id', '=', item.id),
+        ], limit=1)
+        if link:
+            return link
+        link = self.env['surgery.lab.document.link'].create({
+            'document_id': self.id,
+            'medical_item_id': item.id,
+            'filename': filename or self.name,
+        })
+        if post:
+            item.message_post(body=f"Lab document received: {link.filename}")
+        return link
+
+    # ==================== PREVIEWS ====================
+
+    def _generate_preview(self):
+        """Thumbnail for images, first page text for PDFs"""
+        self.ensure_one()
+        raw = self.attachment_id.sudo().raw
+        vals = {'preview_state': 'done'}
+        if self.mimetype and self.mimetype.startswith('image/'):
+            vals['thumbnail'] = image_process(raw, size=(256, 256))
+        elif self.mimetype == 'application/pdf' and PdfFileReader is not None:
+            reader = PdfFileReader(io.BytesIO(raw), strict=False)
+            text = ''
+            for page in reader.pages:
+                text += page.extract_text() or ''
+                if len(text) >= TEXT_PREVIEW_CHARS:
+                    break
+            vals['text_preview'] = text[:TEXT_PREVIEW_CHARS].strip() or False
+        self.write(vals)
+
+    @api.model
+    def _cron_generate_previews(self, batch_size=20):
+        """Generate pending previews one document at a time, committing after each"""
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        while True:
+            self.env.cr.execute("""
+                SELECT id FROM surgery_lab_document
+                 WHERE preview_state = 'pending'
+              ORDER BY id
+                 LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+            """, [batch_size])
+            documents = self.browse([row[0] for row in self.env.cr.fetchall()])
+            if not documents:
+                break
+            for document in documents:
+                try:
+                    with self.env.cr.savepoint():
+                        document._generate_preview()
+                except Exception:
+                    _logger.exception("Preview generation failed for lab document %s", document.id)
+                    document.preview_state = 'failed'
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+
+    def action_download(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/web/content/{self.attachment_id.id}?download=true',
+            'target': 'self',
+        }
+
+
+class SurgeryLabDocumentLink(models.Model):
+    _name = 'surgery.lab.document.link'
+    _description = 'Lab Document on Checklist Item'
+    _order = 'create_date desc, id desc'
+
+    document_id = fields.Many2one(
+        'surgery.lab.document',
+        string='Document',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    medical_item_id = fields.Many2one(
+        'surgery.medical.item',
+        string='Checklist Item',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    surgery_case_id = fields.Many2one(
+        related='medical_item_id.surgery_case_id',
+        string='Surgery Case',
+        store=True,
+        index=True
+    )
+
+    filename = fields.Char(string='File Name')
+    mimetype = fields.Char(related='document_id.mimetype')
+    file_size = fields.Integer(related='document_id.file_size')
+    preview_state = fields.Selection(related='document_id.preview_state')
+    thumbnail = fields.Image(related='document_id.thumbnail')
+    text_preview = fields.Text(related='document_id.text_preview')
+
+    _sql_constraints = [
+        ('document_item_uniq', 'unique(document_id, medical_item_id)',
+         'This document is already linked to the checklist item.'),
+    ]
+
+    def action_download(self):
+        return self.document_id.action_download()
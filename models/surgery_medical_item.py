@@ -1,5 +1,8 @@
 from odoo import models, fields, api
 
+from .surgery_fulltext import init_tsvector_column
+from .surgery_lab_document import LAB_MIMETYPES
+
 
 class SurgeryMedicalItem(models.Model):
     _name = 'surgery.medical.item'
@@ -10,6 +13,7 @@ class SurgeryMedicalItem(models.Model):
         'surgery.case',
         string='Surgery Case',
         required=True,
+        index=True,
         ondelete='cascade'
     )
 
@@ -42,6 +46,21 @@ class SurgeryMedicalItem(models.Model):
     reviewed_by = fields.Many2one('res.users', string='Reviewed By', readonly=True)
     reviewed_date = fields.Datetime(string='Reviewed Date', readonly=True)
 
+    lab_document_link_ids = fields.One2many(
+        'surgery.lab.document.link',
+        'medical_item_id',
+        string='Lab Documents'
+    )
+
+    lab_document_count = fields.Integer(
+        compute='_compute_lab_document_count',
+        string='Documents'
+    )
+
+    def init(self):
+        super().init()
+        init_tsvector_column(self.env.cr, self._table, 'notes_tsv', 'notes')
+
     @api.depends('test_type', 'surgery_case_id.patient_age')
     def _compute_is_required(self):
         for item in self:
@@ -55,6 +74,23 @@ class SurgeryMedicalItem(models.Model):
             else:
                 item.is_required = True
 
+    @api.depends('lab_document_link_ids')
+    def _compute_lab_document_count(self):
+        counts = dict(self.env['surgery.lab.document.link']._read_group(
+            [('medical_item_id', 'in', self.ids)], ['medical_item_id'], ['__count'],
+        ))
+        for item in self:
+            item.lab_document_count = counts.get(item, 0)
+
+    def _message_post_after_hook(self, message, msg_vals):
+        """Lab results mailed or attached in the chatter become lab documents"""
+        LabDocument = self.env['surgery.lab.document']
+        for attachment in message.attachment_ids:
+            if attachment.mimetype and attachment.mimetype.startswith(LAB_MIMETYPES) and attachment.checksum:
+                document, _created = LabDocument._get_or_create_from_attachment(attachment)
+                document._link_to_item(self, attachment.name, post=False)
+        return super()._message_post_after_hook(message, msg_vals)
+
     def write(self, vals):
         """Track who reviewed the item when status changes"""
         if 'status' in vals and vals['status'] != 'awaited':
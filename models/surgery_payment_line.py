@@ -1,15 +1,28 @@
 from odoo import models, fields, api
+from odoo.tools.sql import create_index, index_exists
+
+from .surgery_fulltext import init_tsvector_column
+
+# Sources a case can only have one line of
+SINGLETON_SOURCES = ('client', 'surgicenter')
+# Changes that invalidate the cash projection of a line
+PROJECTION_FIELDS = {'payment_source', 'partner_id', 'expected_amount', 'received_amount',
+                     'status', 'claim_status', 'surgery_case_id'}
 
 
 class SurgeryPaymentLine(models.Model):
     _name = 'surgery.payment.line'
     _description = 'Surgery Payment Line'
+    _inherit = ['surgery.event.outbox.mixin']
     _order = 'payment_source, id'
+    _outbox_fields = ('status', 'claim_status', 'expected_amount', 'received_amount')
+    _outbox_context_fields = ('surgery_case_id', 'payment_source')
 
     surgery_case_id = fields.Many2one(
         'surgery.case',
         string='Surgery Case',
         required=True,
+        index=True,
         ondelete='cascade'
     )
 
@@ -113,6 +126,27 @@ class SurgeryPaymentLine(models.Model):
         store=True
     )
 
+    # Cash projection, refreshed by surgery.payment.lag.stat._refresh_projections
+    projected_date = fields.Date(
+        string='Projected Payment Date',
+        readonly=True,
+        copy=False
+    )
+
+    projected_amount = fields.Monetary(
+        string='Projected Inflow',
+        readonly=True,
+        copy=False,
+        currency_field='currency_id',
+        help='Outstanding balance, reduced by the denial rate for pending insurance claims'
+    )
+
+    projection_stale = fields.Boolean(
+        string='Projection Outdated',
+        default=True,
+        copy=False
+    )
+
     # Dynamic domain for partner_id based on payment_source (works per-row in list views)
     partner_id_domain = fields.Char(
         compute='_compute_partner_id_domain',
@@ -120,6 +154,30 @@ class SurgeryPaymentLine(models.Model):
         store=False
     )
 
+    def init(self):
+        super().init()
+        # Incremental cash projection refresh
+        create_index(self.env.cr, 'surgery_payment_line_projection_stale_index',
+                     self._table, ['id'], where='projection_stale')
+        init_tsvector_column(self.env.cr, self._table, 'reference_tsv', 'reference')
+        self._init_singleton_index()
+
+    def _init_singleton_index(self):
+        """At most one client and one surgicenter line per case.
+
+        A partial unique index rather than an SQL constraint, since a case
+        can have any number of insurance lines. Existing duplicates are
+        merged by the 18.0.1.1.0 migration before this runs.
+        """
+        indexname = 'surgery_payment_line_case_source_uniq'
+        if index_exists(self.env.cr, indexname):
+            return
+        self.env.cr.execute(f"""
+            CREATE UNIQUE INDEX {indexname}
+                ON {self._table} (surgery_case_id, payment_source)
+             WHERE payment_source IN %s
+        """, [SINGLETON_SOURCES])
+
     @api.depends('payment_source')
     def _compute_partner_id_domain(self):
         """Compute dynamic domain for partner_id based on payment source"""
@@ -153,6 +211,55 @@ class SurgeryPaymentLine(models.Model):
         else:
             self.status = 'unpaid'
 
+    @api.model
+    def _suggest_status(self, expected_amount, received_amount):
+        if received_amount >= (expected_amount or 0) and received_amount > 0:
+            return 'paid'
+        if received_amount > 0:
+            return 'partial'
+        return 'unpaid'
+
+    @api.model
+    def _upsert_singleton_lines(self, payment_source, vals_by_case, create_vals_by_case=None):
+        """Write the client or surgicenter line of each case, creating missing ones.
+
+        vals_by_case maps case ids to values written on the existing line or
+        used to create it; create_vals_by_case adds values used on creation
+        only. The status is suggested from the amounts unless given. Callers
+        must hold a row lock on the cases (see SurgeryCase._lock_cases), the
+        unique index on (case, source) being the last line of defence.
+        """
+        assert payment_source in SINGLETON_SOURCES
+        create_vals_by_case = create_vals_by_case or {}
+        lines = self.search([
+            ('surgery_case_id', 'in', list(vals_by_case)),
+            ('payment_source', '=', payment_source),
+        ])
+        line_by_case = {line.surgery_case_id.id: line for line in lines}
+        to_create = []
+        for case_id, vals in vals_by_case.items():
+            line = line_by_case.get(case_id)
+            if line:
+                vals = dict(vals)
+                if 'received_amount' in vals and 'status' not in vals:
+                    vals['status'] = self._suggest_status(
+                        vals.get('expected_amount', line.expected_amount), vals['received_amount']
+                    )
+                line.write(vals)
+            else:
+                vals = {
+                    **create_vals_by_case.get(case_id, {}),
+                    **vals,
+                    'surgery_case_id': case_id,
+                    'payment_source': payment_source,
+                }
+                if 'status' not in vals:
+                    vals['status'] = self._suggest_status(
+                        vals.get('expected_amount', 0), vals.get('received_amount', 0)
+                    )
+                to_create.append(vals)
+        return lines | self.create(to_create)
+
     @api.depends('surgery_case_id.sale_order_total', 'surgery_case_id.payment_total_received')
     def _compute_sale_order_balance(self):
         for line in self:
@@ -209,4 +316,6 @@ class SurgeryPaymentLine(models.Model):
                     msg = f"Payment line updated ({source_label}{' - ' + company if company else ''}): {', '.join(changes)}"
                     record.surgery_case_id.message_post(body=msg)
 
+        if PROJECTION_FIELDS & set(vals):
+            vals = dict(vals, projection_stale=True)
         return super().write(vals)
@@ -0,0 +1,113 @@
+import functools
+import time
+from datetime import timedelta
+
+from odoo import models, fields, api, tools
+from odoo.tools import str2bool
+
+PERF_LOGGING_PARAM = 'hamarpea_odoo_surgery_coordination.perf_logging'
+PERF_RETENTION_PARAM = 'hamarpea_odoo_surgery_coordination.perf_log_retention_days'
+
+
+def surgery_timed(action_name):
+    """Record wall time, SQL query count and record count of each call.
+
+    Opt-in: nothing is measured unless the perf_logging system parameter is
+    set, in which case every successful call adds a surgery.perf.log row.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            PerfLog = self.env['surgery.perf.log']
+            if not PerfLog._is_enabled():
+                return method(self, *args, **kwargs)
+            cr = self.env.cr
+            query_count = cr.sql_log_count
+            start = time.perf_counter()
+            result = method(self, *args, **kwargs)
+            PerfLog.sudo()._log(
+                action_name,
+                (time.perf_counter() - start) * 1000,
+                cr.sql_log_count - query_count,
+                len(self),
+            )
+            return result
+        return wrapper
+    return decorator
+
+
+class SurgeryPerfLog(models.Model):
+    _name = 'surgery.perf.log'
+    _description = 'Surgery Action Timing'
+    _order = 'id desc'
+    _log_access = False
+
+    action = fields.Char(string='Action', required=True, index=True)
+    user_id = fields.Many2one('res.users', string='User', ondelete='set null')
+    date = fields.Datetime(string='Date', required=True, index=True, default=fields.Datetime.now)
+    duration_ms = fields.Float(string='Duration (ms)', digits=(16, 1), aggregator='avg')
+    query_count = fields.Integer(string='Queries', aggregator='avg')
+    record_count = fields.Integer(string='Records', aggregator='avg')
+
+    @api.model
+    def _is_enabled(self):
+        return str2bool(self.env['ir.config_parameter'].sudo().get_param(PERF_LOGGING_PARAM, 'False'))
+
+    @api.model
+    def _log(self, action, duration_ms, query_count, record_count):
+        return self.create({
+            'action': action,
+            'user_id': self.env.uid,
+            'duration_ms': duration_ms,
+            'query_count': query_count,
+            'record_count': record_count,
+        })
+
+    @api.autovacuum
+    def _gc_perf_logs(self):
+        """Rotate the log: drop entries older than the retention period"""
+        days = int(self.env['ir.config_parameter'].sudo().get_param(PERF_RETENTION_PARAM, 30))
+        self.env.cr.execute(
+            "DELETE FROM surgery_perf_log WHERE date < %s",
+            [fields.Datetime.now() - timedelta(days=days)],
+        )
+
+
+class SurgeryPerfLogReport(models.Model):
+    _name = 'surgery.perf.log.report'
+    _description = 'Surgery Action Timing Summary'
+    _auto = False
+    _order = 'action, dimension, user_id'
+
+    dimension = fields.Selection([
+        ('action', 'Action'),
+        ('user', 'Action and User')
+    ], string='Breakdown', readonly=True)
+
+    action = fields.Char(string='Action', readonly=True)
+    user_id = fields.Many2one('res.users', string='User', readonly=True)
+    call_count = fields.Integer(string='Calls', readonly=True)
+    avg_queries = fields.Float(string='Avg Queries', readonly=True, aggregator=False)
+    avg_records = fields.Float(string='Avg Records', readonly=True, aggregator=False)
+    p50_ms = fields.Float(string='p50 (ms)', readonly=True, aggregator=False)
+    p95_ms = fields.Float(string='p95 (ms)', readonly=True, aggregator=False)
+    p99_ms = fields.Float(string='p99 (ms)', readonly=True, aggregator=False)
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(f"""
+            CREATE OR REPLACE VIEW {self._table} AS (
+                SELECT ROW_NUMBER() OVER () AS id,
+                       CASE WHEN GROUPING(l.user_id) = 0 THEN 'user' ELSE 'action' END AS dimension,
+                       l.action,
+                       l.user_id,
+                       COUNT(*) AS call_count,
+                       AVG(l.query_count) AS avg_queries,
+                       AVG(l.record_count) AS avg_records,
+                       PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY l.duration_ms) AS p50_ms,
+                       PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY l.duration_ms) AS p95_ms,
+                       PERCENTILE_CONT(0.99) WITHIN GROUP (ORDER BY l.duration_ms) AS p99_ms
+                  FROM surgery_perf_log l
+              GROUP BY GROUPING SETS ((l.action), (l.action, l.user_id))
+            )
+        """)
@@ -0,0 +1,256 @@
+import logging
+import threading
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError, ValidationError
+
+_logger = logging.getLogger(__name__)
+
+RECOMPUTE_MODELS = [
+    ('surgery.case', 'Surgery Case'),
+    ('surgery.payment.line', 'Payment Line'),
+    ('surgery.medical.item', 'Medical Checklist Item'),
+    ('sale.order.line', 'Sales Order Line'),
+]
+# Beyond this, changes are still counted but no longer itemized
+MAX_RECORDED_CHANGES = 10000
+
+
+class SurgeryRecomputeJob(models.Model):
+    _name = 'surgery.recompute.job'
+    _description = 'Stored Field Recompute Job'
+    _order = 'id desc'
+
+    name = fields.Char(string='Description', required=True, default='Recompute')
+
+    model_name = fields.Selection(
+        RECOMPUTE_MODELS,
+        string='Model',
+        required=True,
+        default='surgery.case'
+    )
+
+    field_names = fields.Char(
+        string='Fields',
+        required=True,
+        help='Comma-separated stored computed fields, e.g. financial_status, so_status, sale_order_total'
+    )
+
+    chunk_size = fields.Integer(
+        string='Chunk Size',
+        default=500,
+        help='Records recomputed and committed together'
+    )
+
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed')
+    ], default='draft', required=True, index=True, string='Status')
+
+    last_id = fields.Integer(
+        string='Resume After ID',
+        readonly=True,
+        help='Highest record id already recomputed; the next chunk starts after it'
+    )
+
+    total_count = fields.Integer(string='Records', readonly=True)
+    processed_count = fields.Integer(string='Processed', readonly=True)
+    changed_count = fields.Integer(string='Changed Values', readonly=True)
+
+    progress = fields.Float(
+        string='Progress',
+        compute='_compute_progress'
+    )
+
+    date_start = fields.Datetime(string='Started On', readonly=True)
+    date_done = fields.Datetime(string='Done On', readonly=True)
+    last_error = fields.Text(string='Last Error', readonly=True)
+
+    change_ids = fields.One2many(
+        'surgery.recompute.change',
+        'job_id',
+        string='Changes'
+    )
+
+    @api.depends('processed_count', 'total_count')
+    def _compute_progress(self):
+        for job in self:
+            job.progress = job.processed_count * 100.0 / job.total_count if job.total_count else 0
+
+    def _get_field_names(self):
+        return [name.strip() for name in (self.field_names or '').split(',') if name.strip()]
+
+    @api.constrains('model_name', 'field_names')
+    def _check_field_names(self):
+        for job in self:
+            model = self.env[job.model_name]
+            names = job._get_field_names()
+            if not names:
+                raise ValidationError("Give at least one field to recompute.")
+            for name in names:
+                field = model._fields.get(name)
+                if not field or not field.store or not field.compute or not field.column_type:
+                    raise ValidationError(f"{name} is not a stored computed field of {job.model_name}.")
+
+    def action_start(self):
+        """Queue the jobs for the cron, resuming where they stopped"""
+        for job in self:
+            if job.state == 'done':
+                raise UserError(f"{job.name} is already done; duplicate it to run it again.")
+            vals = {'state': 'running', 'last_error': False}
+            if not job.date_start:
+                vals.update({
+                    'date_start': fields.Datetime.now(),
+                    'total_count': self.env[job.model_name].with_context(active_test=False).search_count([]),
+                })
+            job.write(vals)
+        self.env.ref('hamarpea_odoo_surgery_coordination.ir_cron_surgery_recompute')._trigger()
+
+    def action_stop(self):
+        self.filtered(lambda j: j.state == 'running').write({'state': 'draft'})
+
+    def action_restart(self):
+        self.write({
+            'state': 'draft',
+            'last_id': 0,
+            'processed_count': 0,
+            'changed_count': 0,
+            'date_start': False,
+            'date_done': False,
+            'last_error': False,
+        })
+        self.change_ids.unlink()
+
+    def action_view_changes(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': f'Changes: {self.name}',
+            'res_model': 'surgery.recompute.change',
+            'view_mode': 'list',
+            'domain': [('job_id', '=', self.id)],
+            'context': {'search_default_group_field': 1},
+        }
+
+    def _read_columns(self, ids, names):
+        self.env.cr.execute(
+            f"SELECT id, {', '.join(f'{name}::text' for name in names)} "
+            f"FROM {self.env[self.model_name]._table} WHERE id = ANY(%s)",
+            [ids],
+        )
+        return {row[0]: row[1:] for row in self.env.cr.fetchall()}
+
+    def _run_chunk(self):
+        """Recompute the next chunk of records and log the values that changed.
+
+        Values are compared column to column before and after the flush, so
+        only real changes are reported. Returns False once no record is left.
+        """
+        self.ensure_one()
+        Model = self.env[self.model_name].with_context(active_test=False, tracking_disable=True)
+        names = self._get_field_names()
+        records = Model.search([('id', '>', self.last_id)], order='id', limit=self.chunk_size or 500)
+        if not records:
+            self.write({'state': 'done', 'date_done': fields.Datetime.now()})
+            return False
+
+        self.env.flush_all()
+        before = self._read_columns(records.ids, names)
+        for name in names:
+            self.env.add_to_compute(Model._fields[name], records)
+        self.env.flush_all()
+        after = self._read_columns(records.ids, names)
+
+        changes = []
+        for record_id, new_values in after.items():
+            for name, old, new in zip(names, before.get(record_id, ()), new_values):
+                if old != new:
+                    changes.append({
+                        'job_id': self.id,
+                        'res_id': record_id,
+                        'field_name': name,
+                        'old_value': old,
+                        'new_value': new,
+                    })
+        room = MAX_RECORDED_CHANGES - self.changed_count
+        if room > 0:
+            self.env['surgery.recompute.change'].create(changes[:room])
+        self.write({
+            'last_id': records.ids[-1],
+            'processed_count': self.processed_count + len(records),
+            'changed_count': self.changed_count + len(changes),
+        })
+        return True
+
+    def _claim_running(self):
+        """Lock one running job, skipping those another worker holds"""
+        self.env.cr.execute("""
+            SELECT id FROM surgery_recompute_job
+             WHERE state = 'running'
+          ORDER BY id
+             LIMIT 1
+               FOR UPDATE SKIP LOCKED
+        """)
+        row = self.env.cr.fetchone()
+        return self.browse(row[0] if row else [])
+
+    @api.model
+    def _cron_run_jobs(self):
+        """Run queued jobs chunk by chunk, committing and clearing the cache after each.
+
+        Progress is saved with every chunk, so an interrupted run resumes
+        from the last committed chunk on the next call.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        while True:
+            job = self._claim_running()
+            if not job:
+                break
+            job_id = job.id
+            try:
+                with self.env.cr.savepoint():
+                    job._run_chunk()
+            except Exception as e:
+                _logger.exception("Recompute job %s failed after id %s", job_id, job.last_id)
+                self.env.invalidate_all()
+                self.browse(job_id).write({'state': 'failed', 'last_error': str(e)})
+            if auto_commit:
+                self.env.cr.commit()
+            self.env.invalidate_all()
+
+    @api.model
+    def _recompute_fields(self, model_name, field_names, chunk_size=500, name=None):
+        """Shell helper: recompute fields of a model now, chunk by chunk.
+
+            env['surgery.recompute.job']._recompute_fields('surgery.case', ['financial_status', 'so_status'])
+        """
+        job = self.create({
+            'name': name or f"Recompute {model_name}",
+            'model_name': model_name,
+            'field_names': ', '.join(field_names),
+            'chunk_size': chunk_size,
+        })
+        job.action_start()
+        self._cron_run_jobs()
+        return job
+
+
+class SurgeryRecomputeChange(models.Model):
+    _name = 'surgery.recompute.change'
+    _description = 'Stored Field Recompute Change'
+    _order = 'job_id, res_id, field_name'
+
+    job_id = fields.Many2one(
+        'surgery.recompute.job',
+        string='Job',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    res_id = fields.Integer(string='Record ID', readonly=True)
+    field_name = fields.Char(string='Field', readonly=True)
+    old_value = fields.Char(string='Old Value', readonly=True)
+    new_value = fields.Char(string='New Value', readonly=True)
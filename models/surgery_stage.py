@@ -9,4 +9,14 @@ class SurgeryStage(models.Model):
     name = fields.Char(string='Stage Name', required=True, translate=True)
     sequence = fields.Integer(string='Sequence', default=10)
     fold = fields.Boolean(string='Folded in Kanban')
+    is_closed = fields.Boolean(
+        string='Closing Stage',
+        help='Cases in this stage are finished and no longer count as open'
+    )
+    forecast_weight = fields.Float(
+        string='Forecast Weight',
+        default=1.0,
+        digits=(3, 2),
+        help='Share of scheduled cases in this stage expected to go ahead (0 to 1), used by the OR forecast'
+    )
     description = fields.Text(string='Description')
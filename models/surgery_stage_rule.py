@@ -0,0 +1,209 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from dateutil.relativedelta import relativedelta
+
+from odoo import models, fields, api
+from odoo.exceptions import ValidationError
+from odoo.osv import expression
+from odoo.tools.safe_eval import safe_eval
+
+_logger = logging.getLogger(__name__)
+
+LOG_RETENTION_DAYS = 180
+
+
+class SurgeryStageRule(models.Model):
+    _name = 'surgery.stage.rule'
+    _description = 'Surgery Stage Automation Rule'
+    _order = 'sequence, id'
+
+    name = fields.Char(string='Rule', required=True)
+    sequence = fields.Integer(default=10)
+    active = fields.Boolean(default=True)
+
+    from_stage_ids = fields.Many2many(
+        'surgery.stage',
+        'surgery_stage_rule_from_stage_rel',
+        'rule_id',
+        'stage_id',
+        string='From Stages',
+        help='Only cases in these stages are moved; leave empty for any stage'
+    )
+
+    stage_id = fields.Many2one(
+        'surgery.stage',
+        string='Move To',
+        required=True,
+        ondelete='cascade'
+    )
+
+    domain = fields.Char(
+        string='Conditions',
+        required=True,
+        default='[]',
+        help='Cases matching this domain are moved; context_today(), datetime and relativedelta are available'
+    )
+
+    delay_days = fields.Integer(
+        string='Delay (Days)',
+        help='Wait this many days after the reference date before moving a case'
+    )
+
+    delay_from = fields.Selection([
+        ('stage', 'Entering the current stage'),
+        ('surgery_date', 'Surgery date')
+    ], string='Delay From', required=True, default='stage')
+
+    log_ids = fields.One2many(
+        'surgery.stage.rule.log',
+        'rule_id',
+        string='Runs'
+    )
+
+    last_run = fields.Datetime(string='Last Run', readonly=True)
+    last_moved_count = fields.Integer(string='Last Moved', readonly=True)
+
+    @api.constrains('domain')
+    def _check_domain(self):
+        for rule in self:
+            try:
+                self.env['surgery.case'].search_count(rule._get_case_domain(), limit=1)
+            except Exception as e:
+                raise ValidationError(f"Invalid conditions on rule {rule.name}: {e}")
+
+    def _get_case_domain(self):
+        """Domain of the cases the rule would move now.
+
+        Cases already in the target stage never match, so running a rule
+        twice moves nothing the second time.
+        """
+        self.ensure_one()
+        today = fields.Date.context_today(self)
+        eval_context = {
+            'context_today': lambda: today,
+            'datetime': datetime,
+            'relativedelta': relativedelta,
+            'uid': self.env.uid,
+        }
+        domain = [('stage_id', '!=', self.stage_id.id)]
+        if self.from_stage_ids:
+            domain.append(('stage_id', 'in', self.from_stage_ids.ids))
+        if self.delay_from == 'surgery_date':
+            domain.append(('surgery_date', '<=', today - timedelta(days=self.delay_days)))
+        elif self.delay_days:
+            domain.append(('date_stage_entered', '<=', fields.Datetime.now() - timedelta(days=self.delay_days)))
+        return expression.AND([domain, safe_eval(self.domain or '[]', eval_context)])
+
+    def _run(self, dry_run=False, exclude_ids=()):
+        """Move the matching cases with one search and one write.
+
+        Returns the cases that matched. A real run that moves cases is
+        logged; the case write takes care of the stage ledger and fee
+        locking for the whole batch.
+        """
+        self.ensure_one()
+        start = time.monotonic()
+        domain = self._get_case_domain()
+        if exclude_ids:
+            domain = expression.AND([domain, [('id', 'not in', list(exclude_ids))]])
+        cases = self.env['surgery.case'].search(domain)
+        if dry_run:
+            return cases
+        if cases:
+            cases.write({'stage_id': self.stage_id.id})
+        self.write({'last_run': fields.Datetime.now(), 'last_moved_count': len(cases)})
+        if not cases:
+            return cases
+        self.env['surgery.stage.rule.log'].create({
+            'rule_id': self.id,
+            'stage_id': self.stage_id.id,
+            'case_count': len(cases),
+            'case_ids': [(6, 0, cases.ids)],
+            'duration_ms': (time.monotonic() - start) * 1000,
+        })
+        return cases
+
+    def action_preview(self):
+        """Dry run: list the cases the rule would move, without moving them"""
+        self.ensure_one()
+        cases = self._run(dry_run=True)
+        return {
+            'type': 'ir.actions.act_window',
+            'name': f'Would Move: {self.name}',
+            'res_model': 'surgery.case',
+            'view_mode': 'list,form',
+            'domain': [('id', 'in', cases.ids)],
+            'target': 'current',
+        }
+
+    def action_run(self):
+        moved = 0
+        for rule in self:
+            moved += len(rule._run())
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Stage Automation',
+                'message': f"{moved} case(s) moved.",
+                'type': 'success',
+                'sticky': False,
+                'next': {'type': 'ir.actions.act_window_close'},
+            },
+        }
+
+    @api.model
+    def _cron_apply_rules(self):
+        """Apply every active rule in sequence, committing after each.
+
+        A case moved by a rule is left alone by the following rules of the
+        same pass, so one run advances a case by at most one stage.
+        """
+        auto_commit = not getattr(threading.current_thread(), 'testing', False)
+        moved_ids = set()
+        for rule in self.search([]):
+            try:
+                with self.env.cr.savepoint():
+                    moved_ids.update(rule._run(exclude_ids=moved_ids).ids)
+            except Exception:
+                _logger.exception("Stage automation rule %s failed", rule.name)
+            if auto_commit:
+                self.env.cr.commit()
+
+
+class SurgeryStageRuleLog(models.Model):
+    _name = 'surgery.stage.rule.log'
+    _description = 'Surgery Stage Automation Run'
+    _order = 'date desc, id desc'
+
+    rule_id = fields.Many2one(
+        'surgery.stage.rule',
+        string='Rule',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    date = fields.Datetime(string='Run On', required=True, default=fields.Datetime.now)
+    stage_id = fields.Many2one('surgery.stage', string='Moved To', ondelete='cascade')
+    case_count = fields.Integer(string='Cases Moved')
+
+    case_ids = fields.Many2many(
+        'surgery.case',
+        'surgery_stage_rule_log_case_rel',
+        'log_id',
+        'case_id',
+        string='Cases'
+    )
+
+    duration_ms = fields.Float(string='Duration (ms)', digits=(16, 1), aggregator='avg')
+
+    @api.autovacuum
+    def _gc_logs(self):
+        self.env.cr.execute(
+            "DELETE FROM surgery_stage_rule_log WHERE date < %s",
+            [fields.Datetime.now() - timedelta(days=LOG_RETENTION_DAYS)],
+        )
@@ -0,0 +1,201 @@
+import base64
+import csv
+import io
+
+from odoo import models, fields, api
+
+
+class SurgerySurgicenterStatement(models.Model):
+    _name = 'surgery.surgicenter.statement'
+    _description = 'Surgical Center Payout Statement'
+    _order = 'date_from desc, partner_id'
+
+    name = fields.Char(
+        string='Statement',
+        compute='_compute_name',
+        store=True
+    )
+
+    partner_id = fields.Many2one(
+        'res.partner',
+        string='Surgical Center',
+        required=True,
+        index=True,
+        ondelete='cascade'
+    )
+
+    date_from = fields.Date(string='From', required=True)
+    date_to = fields.Date(string='To', required=True)
+
+    case_count = fields.Integer(string='Cases', readonly=True)
+
+    gross_amount = fields.Monetary(
+        string='Gross Fees',
+        readonly=True,
+        help='Surgeon fees before the processing fee'
+    )
+
+    processing_fee_amount = fields.Monetary(
+        string='Processing Fees',
+        readonly=True
+    )
+
+    net_expected_amount = fields.Monetary(
+        string='Expected Payment',
+        readonly=True,
+        help='Gross fees less processing fees'
+    )
+
+    received_amount = fields.Monetary(
+        string='Received',
+        readonly=True,
+        help='Received on surgicenter payment lines of the cases'
+    )
+
+    balance = fields.Monetary(
+        string='Balance',
+        compute='_compute_balance',
+        store=True
+    )
+
+    currency_id = fields.Many2one(
+        'res.currency',
+        string='Currency',
+        default=lambda self: self.env.company.currency_id
+    )
+
+    _sql_constraints = [
+        ('partner_period_uniq', 'unique(partner_id, date_from, date_to)',
+         'There is already a statement for this surgical center and period.'),
+    ]
+
+    @api.depends('partner_id.name', 'date_from', 'date_to')
+    def _compute_name(self):
+        for statement in self:
+            statement.name = f"{statement.partner_id.name or ''} {statement.date_from} - {statement.date_to}"
+
+    @api.depends('net_expected_amount', 'received_amount')
+    def _compute_balance(self):
+        for statement in self:
+            statement.balance = statement.net_expected_amount - statement.received_amount
+
+    @api.model
+    def _generate(self, date_from, date_to, partner_ids=None):
+        """(Re)build statements of every surgical center for a period.
+
+        All centers are aggregated by a single grouped query. Closed cases
+        count even once archived by the retention sweep; existing
+        statements for the period (of the given centers, if any) are
+        replaced.
+        """
+        self.env['surgery.case'].flush_model()
+        self.env['surgery.payment.line'].flush_model()
+        center_filter = "AND c.surgicenter_id IN %(partner_ids)s" if partner_ids else ""
+        self.env.cr.execute(f"""
+            WITH cases AS (
+                SELECT c.id, c.surgicenter_id, c.expected_surgeon_payment, c.processing_fee_amount
+                  FROM surgery_case c
+                  JOIN surgery_stage s ON s.id = c.stage_id
+                 WHERE (c.active OR COALESCE(s.is_closed, FALSE))
+                   AND c.surgery_location = 'external'
+                   AND c.surgicenter_id IS NOT NULL
+                   AND c.surgery_date BETWEEN %(date_from)s AND %(date_to)s
+                   {center_filter}
+            ),
+            received AS (
+                SELECT l.surgery_case_id, SUM(l.received_amount) AS amount
+                  FROM surgery_payment_line l
+                  JOIN cases ON cases.id = l.surgery_case_id
+                 WHERE l.payment_source = 'surgicenter'
+              GROUP BY l.surgery_case_id
+            )
+            SELECT cases.surgicenter_id,
+                   COUNT(*),
+                   SUM(COALESCE(cases.expected_surgeon_payment, 0) + COALESCE(cases.processing_fee_amount, 0)),
+                   SUM(COALESCE(cases.processing_fee_amount, 0)),
+                   SUM(COALESCE(cases.expected_surgeon_payment, 0)),
+                   SUM(COALESCE(received.amount, 0))
+              FROM cases
+         LEFT JOIN received ON received.surgery_case_id = cases.id
+          GROUP BY cases.surgicenter_id
+        """, {
+            'date_from': date_from,
+            'date_to': date_to,
+            'partner_ids': tuple(partner_ids or ()),
+        })
+        rows = self.env.cr.fetchall()
+
+        # Also drops statements of centers left without cases in the period
+        stale_domain = [('date_from', '=', date_from), ('date_to', '=', date_to)]
+        if partner_ids:
+            stale_domain.append(('partner_id', 'in', list(partner_ids)))
+        self.search(stale_domain).unlink()
+        return self.create([{
+            'partner_id': partner_id,
+            'date_from': date_from,
+            'date_to': date_to,
+            'case_count': case_count,
+            'gross_amount': gross,
+            'processing_fee_amount': processing,
+            'net_expected_amount': net,
+            'received_amount': received,
+        } for partner_id, case_count, gross, processing, net, received in rows])
+
+    def _get_statement_cases(self):
+        """Map statement ids to their cases, loaded with one search for all statements"""
+        if not self:
+            return {}
+        cases = self.env['surgery.case'].with_context(active_test=False).search([
+            '|', ('active', '=', True), ('stage_id.is_closed', '=', True),
+            ('surgery_location', '=', 'external'),
+            ('surgicenter_id', 'in', self.partner_id.ids),
+            ('surgery_date', '>=', min(self.mapped('date_from'))),
+            ('surgery_date', '<=', max(self.mapped('date_to'))),
+        ], order='surgicenter_id, surgery_date, id')
+        statements_by_center = {}
+        for statement in self:
+            statements_by_center.setdefault(statement.partner_id.id, []).append(statement)
+        result = {statement.id: self.env['surgery.case'] for statement in self}
+        for case in cases:
+            for statement in statements_by_center.get(case.surgicenter_id.id, []):
+                if statement.date_from <= case.surgery_date <= statement.date_to:
+                    result[statement.id] |= case
+        return result
+
+    def action_download_csv(self):
+        """Download one CSV with the case detail of all selected statements"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([
+            'Surgical Center', 'Period From', 'Period To', 'Case', 'Patient', 'Surgery Date',
+            'Procedure', 'Gross Fee', 'Processing Fee', 'Expected Payment', 'Received',
+        ])
+        cases_by_statement = self._get_statement_cases()
+        for statement in self:
+            for case in cases_by_statement[statement.id]:
+                received = sum(case.payment_line_ids.filtered(
+                    lambda l: l.payment_source == 'surgicenter'
+                ).mapped('received_amount'))
+                writer.writerow([
+                    statement.partner_id.name,
+                    statement.date_from,
+                    statement.date_to,
+                    case.name,
+                    case.partner_id.name,
+                    case.surgery_date,
+                    case.surgery_product_id.display_name or '',
+                    case.expected_surgeon_payment + case.processing_fee_amount,
+                    case.processing_fee_amount,
+                    case.expected_surgeon_payment,
+                    received,
+                ])
+        attachment = self.env['ir.attachment'].create({
+            'name': f"surgicenter_statements_{fields.Date.context_today(self)}.csv",
+            'datas': base64.b64encode(buffer.getvalue().encode('utf-8')),
+            'mimetype': 'text/csv',
+        })
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/web/content/{attachment.id}?download=true',
+            'target': 'self',
+        }
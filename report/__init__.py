@@ -0,0 +1 @@
+from . import surgicenter_statement_report
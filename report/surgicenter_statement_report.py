@@ -0,0 +1,17 @@
+from odoo import models, api
+
+
+class ReportSurgicenterStatement(models.AbstractModel):
+    _name = 'report.hamarpea_odoo_surgery_coordination.report_surgicenter_statement'
+    _description = 'Surgical Center Statement Report'
+
+    @api.model
+    def _get_report_values(self, docids, data=None):
+        statements = self.env['surgery.surgicenter.statement'].browse(docids)
+        return {
+            'doc_ids': docids,
+            'doc_model': 'surgery.surgicenter.statement',
+            'docs': statements,
+            # Case detail of every statement, loaded in one go
+            'cases_by_statement': statements._get_statement_cases(),
+        }
@@ -1 +1,5 @@
 from . import generate_reconciliation_so
+from . import surgery_case_export
+from . import generate_surgicenter_statement
+from . import surgery_or_forecast
+from . import surgery_fulltext_search
@@ -1,6 +1,8 @@
 from odoo import models, fields, api
 from odoo.exceptions import UserError
 
+from ..models.surgery_perf_log import surgery_timed
+
 
 class GenerateReconciliationInvoice(models.TransientModel):
     _name = 'surgery.generate.reconciliation.so'
@@ -102,6 +104,7 @@ class GenerateReconciliationInvoice(models.TransientModel):
 
         return res
 
+    @surgery_timed('surgery.generate.reconciliation.so.action_generate_so')
     def action_generate_so(self):
         """Generate the Invoice for reconciliation and mark it as paid"""
         self.ensure_one()
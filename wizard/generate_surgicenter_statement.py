@@ -0,0 +1,49 @@
+from dateutil.relativedelta import relativedelta
+
+from odoo import models, fields
+from odoo.exceptions import UserError
+
+
+class GenerateSurgicenterStatement(models.TransientModel):
+    _name = 'surgery.generate.surgicenter.statement'
+    _description = 'Generate Surgical Center Statements'
+
+    date_from = fields.Date(
+        string='From',
+        required=True,
+        default=lambda self: fields.Date.context_today(self).replace(day=1) - relativedelta(months=1)
+    )
+
+    date_to = fields.Date(
+        string='To',
+        required=True,
+        default=lambda self: fields.Date.context_today(self).replace(day=1) - relativedelta(days=1)
+    )
+
+    partner_ids = fields.Many2many(
+        'res.partner',
+        string='Surgical Centers',
+        domain=[('account_type', '=', 'operating_room')],
+        help='Leave empty to generate statements for every surgical center'
+    )
+
+    def action_generate(self):
+        """Generate statements for all selected centers in one run"""
+        self.ensure_one()
+        if self.date_from > self.date_to:
+            raise UserError("The start date must be before the end date.")
+
+        statements = self.env['surgery.surgicenter.statement']._generate(
+            self.date_from, self.date_to, self.partner_ids.ids
+        )
+        if not statements:
+            raise UserError("No external surgeries found for this period.")
+
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'Surgicenter Statements',
+            'res_model': 'surgery.surgicenter.statement',
+            'view_mode': 'list,form',
+            'domain': [('id', 'in', statements.ids)],
+            'target': 'current',
+        }
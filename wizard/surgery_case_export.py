@@ -0,0 +1,184 @@
+import csv
+import io
+import os
+import tempfile
+
+from odoo import models, fields, api
+from odoo.tools.misc import xlsxwriter
+
+EXPORT_CHUNK_SIZE = 1000
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+class SurgeryCaseExport(models.TransientModel):
+    _name = 'surgery.case.export'
+    _description = 'Accounting Export of Surgery Cases'
+
+    file_format = fields.Selection([
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel (XLSX)')
+    ], default='csv', required=True, string='Format')
+
+    date_from = fields.Date(
+        string='Surgery Date From'
+    )
+
+    date_to = fields.Date(
+        string='Surgery Date To'
+    )
+
+    case_ids = fields.Many2many(
+        'surgery.case',
+        string='Selected Cases',
+        help='Leave empty to export every case in the date range'
+    )
+
+    @api.model
+    def default_get(self, fields_list):
+        res = super().default_get(fields_list)
+        if self.env.context.get('active_model') == 'surgery.case' and self.env.context.get('active_ids'):
+            res['case_ids'] = [(6, 0, self.env.context['active_ids'])]
+        return res
+
+    def action_export(self):
+        """Hand over to the streaming controller"""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/surgery/export/accounting/{self.id}',
+            'target': 'self',
+        }
+
+    # ==================== EXPORT ====================
+
+    def _get_case_domain(self):
+        self.ensure_one()
+        if self.case_ids:
+            return [('id', 'in', self.case_ids.ids)]
+        domain = []
+        if self.date_from:
+            domain.append(('surgery_date', '>=', self.date_from))
+        if self.date_to:
+            domain.append(('surgery_date', '<=', self.date_to))
+        return domain
+
+    def _get_export_filename(self):
+        self.ensure_one()
+        return f"surgery_cases_payments_{fields.Date.context_today(self)}.{self.file_format}"
+
+    def _get_export_header(self):
+        return [
+            'Case', 'Patient', 'ID Number', 'Surgery Date', 'Stage', 'Surgeon',
+            'Insurance Company', 'Claim Number', 'Claim Status',
+            'Sales Order', 'Sales Order Total', 'Total Expected', 'Total Received',
+            'Payment Source', 'Payment Company', 'Expected', 'Received', 'Balance',
+            'Payment Status', 'Reference', 'Payment Date', 'Currency',
+        ]
+
+    def _iter_export_rows(self):
+        """Yield lists of rows, one list per chunk of cases.
+
+        Each chunk prefetches its partners, sale orders and payment lines in
+        a handful of queries, then the cache is dropped before the next one.
+        """
+        self.ensure_one()
+        SurgeryCase = self.env['surgery.case']
+        PaymentLine = self.env['surgery.payment.line']
+        claim_labels = dict(SurgeryCase._fields['insurance_claim_status'].selection)
+        source_labels = dict(PaymentLine._fields['payment_source'].selection)
+        status_labels = dict(PaymentLine._fields['status'].selection)
+
+        for cases in SurgeryCase._iter_id_chunks(self._get_case_domain(), EXPORT_CHUNK_SIZE):
+            cases.fetch([
+                'name', 'partner_id', 'surgery_date', 'stage_id', 'surgeon_employee_id',
+                'insurance_company_id', 'insurance_claim_number', 'insurance_claim_status',
+                'sale_order_id', 'sale_order_total', 'payment_total_expected',
+                'payment_total_received', 'currency_id',
+            ])
+            cases.partner_id.fetch(['name', 'vat'])
+            cases.insurance_company_id.fetch(['name'])
+            cases.sale_order_id.fetch(['name'])
+            cases.payment_line_ids.fetch([
+                'payment_source', 'partner_id', 'expected_amount', 'received_amount',
+                'balance', 'status', 'reference', 'payment_date',
+            ])
+            cases.payment_line_ids.partner_id.fetch(['name'])
+
+            rows = []
+            for case in cases:
+                case_values = [
+                    case.name,
+                    case.partner_id.name or '',
+                    case.partner_id.vat or '',
+                    fields.Date.to_string(case.surgery_date) or '',
+                    case.stage_id.name or '',
+                    case.surgeon_employee_id.name or '',
+                    case.insurance_company_id.name or '',
+                    case.insurance_claim_number or '',
+                    claim_labels.get(case.insurance_claim_status, ''),
+                    case.sale_order_id.name or '',
+                    case.sale_order_total,
+                    case.payment_total_expected,
+                    case.payment_total_received,
+                ]
+                currency = case.currency_id.name or ''
+                if not case.payment_line_ids:
+                    rows.append(case_values + [''] * 8 + [currency])
+                    continue
+                for line in case.payment_line_ids:
+                    rows.append(case_values + [
+                        source_labels.get(line.payment_source, ''),
+                        line.partner_id.name or '',
+                        line.expected_amount,
+                        line.received_amount,
+                        line.balance,
+                        status_labels.get(line.status, ''),
+                        line.reference or '',
+                        fields.Date.to_string(line.payment_date) or '',
+                        currency,
+                    ])
+            yield rows
+
+    def _iter_csv(self):
+        """Yield the CSV file as encoded blocks, one block per chunk"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self._get_export_header())
+        for rows in self._iter_export_rows():
+            writer.writerows(rows)
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+
+    def _iter_xlsx(self):
+        """Yield the XLSX file in blocks.
+
+        XLSX is a zip archive and cannot be emitted row by row, so rows are
+        written in constant-memory mode to a temporary file which is then
+        streamed back.
+        """
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        try:
+            workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+            worksheet = workbook.add_worksheet('Cases')
+            worksheet.write_row(0, 0, self._get_export_header(), workbook.add_format({'bold': True}))
+            row_index = 1
+            for rows in self._iter_export_rows():
+                for row in rows:
+                    worksheet.write_row(row_index, 0, row)
+                    row_index += 1
+            workbook.close()
+            with open(path, 'rb') as export_file:
+                while block := export_file.read(STREAM_BLOCK_SIZE):
+                    yield block
+        finally:
+            os.unlink(path)
+
+    def _iter_export_file(self):
+        self.ensure_one()
+        if self.file_format == 'xlsx':
+            return self._iter_xlsx()
+        return self._iter_csv()
@@ -0,0 +1,120 @@
+from odoo import models, fields
+from odoo.exceptions import UserError
+
+from ..models.surgery_fulltext import FTS_CONFIG
+
+RESULT_LIMIT = 200
+SOURCE_LABELS = {
+    'plan': 'Surgery Plan',
+    'checklist': 'Checklist Notes',
+    'payment': 'Payment References',
+}
+
+
+class SurgeryFulltextSearch(models.TransientModel):
+    _name = 'surgery.fulltext.search'
+    _description = 'Surgery Full-Text Search'
+
+    query = fields.Char(
+        string='Search',
+        required=True,
+        help='Words to look for; use quotes for phrases, OR for alternatives and - to exclude'
+    )
+
+    result_ids = fields.One2many(
+        'surgery.fulltext.search.result',
+        'search_id',
+        string='Results'
+    )
+
+    def action_search(self):
+        """Rank cases by matches in their plan, checklist notes and payment references.
+
+        Plan matches weigh most, then checklist notes, then references. Only
+        the top results get a highlighted snippet, ts_headline being costly.
+        """
+        self.ensure_one()
+        self.env['surgery.case'].flush_model(['surgery_plan', 'active'])
+        self.env['surgery.medical.item'].flush_model(['notes'])
+        self.env['surgery.payment.line'].flush_model(['reference'])
+        self.env.cr.execute("""
+            WITH q AS (SELECT websearch_to_tsquery(%(config)s, %(query)s) AS query),
+            hits AS (
+                SELECT c.id AS case_id, ts_rank(c.surgery_plan_tsv, q.query) AS rank, 'plan' AS source
+                  FROM surgery_case c, q
+                 WHERE c.surgery_plan_tsv @@ q.query
+                UNION ALL
+                SELECT m.surgery_case_id, ts_rank(m.notes_tsv, q.query) * 0.6, 'checklist'
+                  FROM surgery_medical_item m, q
+                 WHERE m.notes_tsv @@ q.query
+                UNION ALL
+                SELECT l.surgery_case_id, ts_rank(l.reference_tsv, q.query) * 0.3, 'payment'
+                  FROM surgery_payment_line l, q
+                 WHERE l.reference_tsv @@ q.query
+            ),
+            ranked AS (
+                SELECT hits.case_id, SUM(hits.rank) AS rank,
+                       STRING_AGG(DISTINCT hits.source, ',') AS sources
+                  FROM hits
+                  JOIN surgery_case c ON c.id = hits.case_id
+                 WHERE c.active
+              GROUP BY hits.case_id
+              ORDER BY rank DESC
+                 LIMIT %(limit)s
+            )
+            SELECT r.case_id, r.rank, r.sources,
+                   ts_headline(%(config)s, COALESCE(c.surgery_plan, ''), q.query, 'MaxFragments=2, MaxWords=20')
+              FROM ranked r
+              JOIN surgery_case c ON c.id = r.case_id, q
+          ORDER BY r.rank DESC
+        """, {'config': FTS_CONFIG, 'query': self.query, 'limit': RESULT_LIMIT})
+        rows = self.env.cr.fetchall()
+
+        # Apply record rules to what the raw query found
+        allowed = set(self.env['surgery.case'].search([('id', 'in', [row[0] for row in rows])]).ids)
+        self.result_ids.unlink()
+        self.env['surgery.fulltext.search.result'].create([{
+            'search_id': self.id,
+            'surgery_case_id': case_id,
+            'rank': rank,
+            'matched_in': ', '.join(SOURCE_LABELS[source] for source in sources.split(',')),
+            'snippet': snippet if 'plan' in sources else False,
+        } for case_id, rank, sources, snippet in rows if case_id in allowed])
+        if not self.result_ids:
+            raise UserError(f"No cases mention \"{self.query}\".")
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
+
+
+class SurgeryFulltextSearchResult(models.TransientModel):
+    _name = 'surgery.fulltext.search.result'
+    _description = 'Surgery Full-Text Search Result'
+    _order = 'rank desc, id'
+
+    search_id = fields.Many2one(
+        'surgery.fulltext.search',
+        required=True,
+        ondelete='cascade'
+    )
+
+    surgery_case_id = fields.Many2one('surgery.case', string='Case', readonly=True)
+    partner_id = fields.Many2one(related='surgery_case_id.partner_id', string='Patient')
+    stage_id = fields.Many2one(related='surgery_case_id.stage_id', string='Stage')
+    rank = fields.Float(string='Relevance', digits=(16, 4), readonly=True)
+    matched_in = fields.Char(string='Found In', readonly=True)
+    snippet = fields.Html(string='Plan Excerpt', readonly=True, sanitize=True)
+
+    def action_open_case(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'res_model': 'surgery.case',
+            'res_id': self.surgery_case_id.id,
+            'view_mode': 'form',
+            'target': 'current',
+        }
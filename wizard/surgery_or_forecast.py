@@ -0,0 +1,193 @@
+from datetime import timedelta
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+IN_HOUSE_CAPACITY_PARAM = 'hamarpea_odoo_surgery_coordination.in_house_or_daily_capacity'
+
+
+class SurgeryOrForecast(models.TransientModel):
+    _name = 'surgery.or.forecast'
+    _description = 'Operating Room Utilization Forecast'
+
+    date_from = fields.Date(
+        string='From',
+        required=True,
+        default=fields.Date.context_today
+    )
+
+    date_to = fields.Date(
+        string='To',
+        required=True,
+        default=lambda self: fields.Date.context_today(self) + timedelta(weeks=12)
+    )
+
+    granularity = fields.Selection([
+        ('day', 'Daily'),
+        ('week', 'Weekly')
+    ], string='Period', required=True, default='week')
+
+    dimension = fields.Selection([
+        ('center', 'Operating Room'),
+        ('surgeon', 'Surgeon')
+    ], string='Per', required=True, default='center')
+
+    line_ids = fields.One2many(
+        'surgery.or.forecast.line',
+        'forecast_id',
+        string='Forecast'
+    )
+
+    def _fetch_cases(self):
+        """Dated open cases of the horizon as parallel arrays, from one query"""
+        self.env['surgery.case'].flush_model(['surgery_date', 'surgery_location', 'surgicenter_id',
+                                              'surgeon_employee_id', 'stage_id', 'active'])
+        self.env.cr.execute("""
+            SELECT c.surgery_date - %(date_from)s,
+                   CASE WHEN c.surgery_location = 'external' THEN COALESCE(c.surgicenter_id, 0) ELSE 0 END,
+                   COALESCE(c.surgeon_employee_id, 0),
+                   COALESCE(s.forecast_weight, 1.0)
+              FROM surgery_case c
+              JOIN surgery_stage s ON s.id = c.stage_id
+             WHERE c.active
+               AND NOT COALESCE(s.is_closed, FALSE)
+               AND c.surgery_date BETWEEN %(date_from)s AND %(date_to)s
+        """, {'date_from': self.date_from, 'date_to': self.date_to})
+        rows = self.env.cr.fetchall()
+        if not rows:
+            return None
+        data = np.array(rows, dtype=np.float64)
+        return data[:, 0].astype(np.int64), data[:, 1].astype(np.int64), \
+            data[:, 2].astype(np.int64), data[:, 3]
+
+    def _get_daily_capacities(self, keys):
+        """Daily case capacity of each center or surgeon key (0 means unknown)"""
+        if self.dimension == 'surgeon':
+            employees = self.env['hr.employee'].browse([int(key) for key in keys if key])
+            capacity = {employee.id: employee.daily_surgery_capacity for employee in employees}
+        else:
+            centers = self.env['res.partner'].browse([int(key) for key in keys if key])
+            capacity = {center.id: center.or_daily_capacity for center in centers}
+            capacity[0] = int(self.env['ir.config_parameter'].sudo().get_param(IN_HOUSE_CAPACITY_PARAM, 0))
+        return np.array([capacity.get(int(key), 0) for key in keys], dtype=np.float64)
+
+    def action_compute(self):
+        """Compute expected cases, utilization and overloads per period.
+
+        Cases are bucketed into a (key, period) matrix with bincount, so the
+        cost is one query plus a few array operations whatever the horizon.
+        """
+        self.ensure_one()
+        if np is None:
+            raise UserError("The OR forecast requires the numpy Python package.")
+        if self.date_from > self.date_to:
+            raise UserError("The start date must be before the end date.")
+
+        self.line_ids.unlink()
+        fetched = self._fetch_cases()
+        if fetched is None:
+            raise UserError("No scheduled open cases in this period.")
+        day_index, center_ids, surgeon_ids, weights = fetched
+
+        period_days = 7 if self.granularity == 'week' else 1
+        horizon_days = (self.date_to - self.date_from).days + 1
+        period_count = -(-horizon_days // period_days)
+        period_index = day_index // period_days
+
+        keys, key_index = np.unique(surgeon_ids if self.dimension == 'surgeon' else center_ids, return_inverse=True)
+        cells = key_index * period_count + period_index
+        size = len(keys) * period_count
+        scheduled = np.bincount(cells, minlength=size).reshape(len(keys), period_count)
+        expected = np.bincount(cells, weights=weights, minlength=size).reshape(len(keys), period_count)
+
+        # The last period may be cut short by the end of the horizon
+        days_in_period = np.full(period_count, period_days, dtype=np.float64)
+        days_in_period[-1] = horizon_days - (period_count - 1) * period_days
+        capacity = np.outer(self._get_daily_capacities(keys), days_in_period)
+        utilization = np.divide(expected, capacity, out=np.zeros_like(expected), where=capacity > 0) * 100
+        overloaded = (capacity > 0) & (expected > capacity)
+
+        key_field = 'surgeon_employee_id' if self.dimension == 'surgeon' else 'surgicenter_id'
+        vals_list = []
+        for row, col in zip(*np.nonzero(scheduled)):
+            vals_list.append({
+                'forecast_id': self.id,
+                'period_start': self.date_from + timedelta(days=int(col) * period_days),
+                key_field: int(keys[row]) or False,
+                'scheduled_cases': int(scheduled[row, col]),
+                'expected_cases': float(expected[row, col]),
+                'capacity': float(capacity[row, col]),
+                'utilization': float(utilization[row, col]),
+                'overloaded': bool(overloaded[row, col]),
+            })
+        self.env['surgery.or.forecast.line'].create(vals_list)
+
+        return {
+            'type': 'ir.actions.act_window',
+            'name': 'OR Utilization Forecast',
+            'res_model': 'surgery.or.forecast.line',
+            'view_mode': 'pivot,graph,list',
+            'domain': [('forecast_id', '=', self.id)],
+            'context': {
+                'pivot_row_groupby': [key_field],
+                'pivot_column_groupby': [f'period_start:{self.granularity}'],
+                'pivot_measures': ['expected_cases', 'capacity', 'utilization'],
+            },
+            'target': 'current',
+        }
+
+
+class SurgeryOrForecastLine(models.TransientModel):
+    _name = 'surgery.or.forecast.line'
+    _description = 'Operating Room Utilization Forecast Line'
+    _order = 'period_start, id'
+
+    forecast_id = fields.Many2one(
+        'surgery.or.forecast',
+        string='Forecast',
+        required=True,
+        ondelete='cascade'
+    )
+
+    period_start = fields.Date(string='Period')
+
+    surgicenter_id = fields.Many2one(
+        'res.partner',
+        string='Surgical Center',
+        help='Empty for the in-house operating room'
+    )
+
+    location = fields.Char(
+        string='Operating Room',
+        compute='_compute_location'
+    )
+
+    surgeon_employee_id = fields.Many2one('hr.employee', string='Surgeon')
+
+    scheduled_cases = fields.Integer(string='Scheduled Cases')
+
+    expected_cases = fields.Float(
+        string='Expected Cases',
+        digits=(16, 1),
+        help='Scheduled cases weighted by the forecast weight of their stage'
+    )
+
+    capacity = fields.Float(string='Capacity', digits=(16, 1))
+
+    utilization = fields.Float(
+        string='Utilization (%)',
+        digits=(16, 1),
+        aggregator='avg'
+    )
+
+    overloaded = fields.Boolean(string='Overloaded')
+
+    @api.depends('surgicenter_id')
+    def _compute_location(self):
+        for line in self:
+            line.location = line.surgicenter_id.name if line.surgicenter_id else 'In-House'